@@ -5,16 +5,32 @@ FastAPI application for KYC verification service.
 FIXED: Missing config import + response format for frontend
 """
 
+from __future__ import annotations
+
 import asyncio
+import base64
+import functools
+import hashlib
+import os
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
-from typing import Optional
+from typing import List, Optional, Tuple, TYPE_CHECKING
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, status
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
 import cv2
 import numpy as np
+import orjson
+
+try:
+    import pybase64 as _b64  # SIMD (AVX2/NEON) base64 codec, drop-in for the stdlib API
+except ImportError:
+    _b64 = base64
 
 # ✅ FIX #1: Added missing import
 from configs.config import config
@@ -33,26 +49,109 @@ from api.schemas import (
     ChallengeStatus,
     LivenessVerificationRequest,
     LivenessVerificationResponse,
+    LivenessVerificationBatchRequest,
+    LivenessVerificationBatchResponse,
     LivenessBatchRequest,
     LivenessBatchResponse,
+    utc_now,
+    format_utc,
 )
 # ✅ LAZY IMPORT: Don't import ML libraries at module level
 # They will be imported inside functions only when needed
 # This allows the server to start even if ML libraries fail
+# Challenge generation is pure Python (no ML deps), so it is safe to import eagerly
+from app.services.liveness_challenges import get_challenge_generator
+from utils.admission import AdmissionController
 from utils.logger import get_logger
 
+if TYPE_CHECKING:
+    # Hint-only imports: never executed at runtime, so startup stays light
+    from app.services.face_detector_id import YuNetFaceDetector
+    from app.services.face_matcher import InsightFaceMatcher
+    from app.services.ocr_extractor import PaddleOCRExtractor, OCRResult
+    from app.services.liveness_detector import LivenessDetector
+    from app.services.face_db import FaceIndex
+
 logger = get_logger(__name__, log_file="api.log")
 
-# Global service instances (type hints will be resolved at runtime)
-face_detector = None
-face_matcher = None
-ocr_extractor = None
-liveness_detector = None  # Liveness detection service
+# Global service instances (populated in lifespan)
+face_detector: Optional[YuNetFaceDetector] = None
+face_matcher: Optional[InsightFaceMatcher] = None
+ocr_extractor: Optional[PaddleOCRExtractor] = None
+liveness_detector: Optional[LivenessDetector] = None  # Liveness detection service
+face_index: Optional[FaceIndex] = None  # Only set when face_db.enabled
 ml_import_error: Optional[str] = None  # Track if ML libraries failed to import
 
-# Semaphore to limit concurrent processing
+# Cached health check body + ETag (built once models are loaded)
+_health_body: Optional[dict] = None
+_health_etag: Optional[str] = None
+
+# Request-path limits (config is immutable after startup, so read once here)
 MAX_CONCURRENT = config.get("processing", "max_concurrent_requests", default=10)
-processing_semaphore = asyncio.Semaphore(MAX_CONCURRENT)
+_MAX_UPLOAD_SIZE = int(config.max_upload_size)
+_IMG_MAX_DIM = int(config.get("upload", "image_max_dimension", default=4096))
+_PROCESSING_MAX_DIM = int(config.get("upload", "processing_max_dimension", default=1600))
+_APP_VERSION = config.get("project", "version", default="1.0.0")
+_MIN_FRAMES = config.get("liveness", "detection", "min_frames", default=10)
+_MAX_VERIFY_BATCH = int(config.get("liveness", "detection", "max_verify_batch", default=8))
+_SKIP_OCR_ON_REJECT = config.get("verification", "skip_ocr_on_reject", default=True)
+_MIN_ID_FACE_CONFIDENCE = float(config.get("verification", "min_id_face_confidence", default=0.0))
+_WARMUP_ON_STARTUP = config.get("processing", "warmup_on_startup", default=True)
+_FACE_DB_ENABLED = config.get("face_db", "enabled", default=False)
+_DUPLICATE_THRESHOLD = float(config.get("face_db", "duplicate_threshold", default=0.5))
+
+# Admission control to limit concurrent processing (cap can be changed at runtime)
+admission = AdmissionController(MAX_CONCURRENT)
+
+# Bounded pool for base64 frame decoding (b64decode + cv2.imdecode release the GIL).
+# Kept small so it cannot starve FastAPI's default threadpool.
+DECODE_WORKERS = min(
+    config.get("processing", "decode_workers", default=4),
+    os.cpu_count() or 1
+)
+frame_decode_executor = ThreadPoolExecutor(
+    max_workers=DECODE_WORKERS,
+    thread_name_prefix="frame-decode"
+)
+
+# Dedicated pool for model inference, decoupled from asyncio's default executor.
+# Each ONNX Runtime session is sized to cpu_count // ML_WORKERS intra-op threads,
+# so total inference threads stay close to the core count.
+ML_WORKERS = config.get("processing", "ml_workers", default=2)
+ml_executor = ThreadPoolExecutor(max_workers=ML_WORKERS, thread_name_prefix="ml")
+
+
+async def run_ml(fn, *args, **kwargs):
+    """
+    Run a blocking model call on the ML executor.
+    Uses run_in_executor directly (no contextvars copy like asyncio.to_thread);
+    keyword arguments are bound with functools.partial.
+    """
+    loop = asyncio.get_running_loop()
+    if kwargs:
+        fn = functools.partial(fn, *args, **kwargs)
+        args = ()
+    return await loop.run_in_executor(ml_executor, fn, *args)
+
+
+def warmup_models() -> None:
+    """
+    Run one dummy inference through each model so ONNX Runtime / Paddle
+    allocate their arenas and pick kernels before the first real request.
+    Blank inputs yield no detections; failures are logged and ignored.
+    """
+    dummy = np.zeros((640, 640, 3), dtype=np.uint8)
+    steps = (
+        ("face detector", lambda: face_detector.detect_and_extract(dummy)),
+        ("face matcher", lambda: face_matcher.get_embedding(np.zeros((112, 112, 3), dtype=np.uint8))),
+        ("OCR extractor", lambda: ocr_extractor.extract_structured(dummy)),
+        ("liveness detector", lambda: liveness_detector.detect_frame(dummy)),
+    )
+    for name, step in steps:
+        try:
+            step()
+        except Exception as e:
+            logger.warning(f"⚠ Warm-up failed for {name}: {e}")
 
 
 # ============================================================================
@@ -62,10 +161,16 @@ processing_semaphore = asyncio.Semaphore(MAX_CONCURRENT)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Load models at startup, cleanup at shutdown."""
-    global face_detector, face_matcher, ocr_extractor, liveness_detector, ml_import_error
+    global face_detector, face_matcher, ocr_extractor, liveness_detector, face_index, ml_import_error
     
     logger.info("🚀 Starting KYC Verification Service...")
     
+    # Bound asyncio's default executor (used by any library to_thread/run_in_executor(None))
+    # so it cannot grow to min(32, cpu+4) threads alongside the ML and decode pools
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="kyc-worker")
+    )
+    
     try:
         # ✅ LAZY IMPORT: Import ML libraries here, not at module level
         logger.info("Importing ML libraries...")
@@ -84,46 +189,87 @@ async def lifespan(app: FastAPI):
         logger.info("✓ ML libraries imported")
         
         logger.info("Loading face detector...")
-        face_detector = await asyncio.to_thread(get_face_detector)
+        face_detector = await run_ml(get_face_detector)
         logger.info("✓ Face detector loaded")
         
         logger.info("Loading face matcher...")
-        face_matcher = await asyncio.to_thread(get_face_matcher)
+        face_matcher = await run_ml(get_face_matcher)
         logger.info("✓ Face matcher loaded")
         
         logger.info("Loading OCR extractor...")
-        ocr_extractor = await asyncio.to_thread(get_ocr_extractor)
+        ocr_extractor = await run_ml(get_ocr_extractor)
         logger.info("✓ OCR extractor loaded")
         
         logger.info("Loading liveness detector...")
         from app.services.liveness_detector import get_liveness_detector
-        liveness_detector = await asyncio.to_thread(get_liveness_detector)
+        liveness_detector = await run_ml(get_liveness_detector)
         logger.info("✓ Liveness detector loaded")
         
+        if _FACE_DB_ENABLED:
+            from app.services.face_db import get_face_index
+            face_index = await run_ml(get_face_index)
+            logger.info("✓ Face index loaded")
+        
         logger.info("✅ All models loaded successfully")
+        
+        if _WARMUP_ON_STARTUP:
+            logger.info("Warming up models...")
+            warmup_start = time.time()
+            await run_ml(warmup_models)
+            logger.info(f"✓ Models warmed up ({(time.time() - warmup_start) * 1000:.0f}ms)")
     except ImportError as e:
         # ML libraries failed to import (e.g., onnxruntime not compatible)
         error_msg = f"ML libraries not available: {str(e)}"
         ml_import_error = error_msg
         logger.error(f"⚠️ {error_msg}")
     
+    _refresh_health_cache()
+    
     yield  # Server starts here
     
     # Cleanup on shutdown
     logger.info("Shutting down...")
-    # Add cleanup code here if needed
+    _invalidate_health_cache()
+    if face_index is not None:
+        face_index.save()
+    ml_executor.shutdown(wait=False, cancel_futures=True)
+    frame_decode_executor.shutdown(wait=False, cancel_futures=True)
 
 
 # ============================================================================
 # FastAPI Application
 # ============================================================================
 
+class ORJSONRequest(Request):
+    """Request whose JSON body is parsed with orjson instead of the stdlib json module."""
+
+    async def json(self):
+        if not hasattr(self, "_json"):
+            # orjson.JSONDecodeError subclasses json.JSONDecodeError, so FastAPI's 422 handling is unchanged
+            self._json = orjson.loads(await self.body())
+        return self._json
+
+
+class ORJSONRoute(APIRoute):
+    """Route that hands endpoints an ORJSONRequest (large base64 frame batches parse in C)."""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            return await handler(ORJSONRequest(request.scope, request.receive))
+
+        return route_handler
+
+
 app = FastAPI(
     title="KYC Verification API",
     description="Face matching and OCR extraction for KYC verification",
-    version=config.get("project", "version", default="1.0.0"),
-    lifespan=lifespan
+    version=_APP_VERSION,
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse  # orjson serializes responses in C
 )
+app.router.route_class = ORJSONRoute  # Must be set before the routes below are registered
 
 # CORS configuration
 cors_origins = config.cors_origins
@@ -142,26 +288,29 @@ app.add_middleware(
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
-    return JSONResponse(
+    # Plain dict in the ErrorResponse shape - skips Pydantic validation on 4xx storms
+    return ORJSONResponse(
         status_code=exc.status_code,
-        content=ErrorResponse(
-            error=exc.__class__.__name__,
-            message=str(exc.detail),
-            details=None
-        ).model_dump(mode="json")
+        content={
+            "error": exc.__class__.__name__,
+            "message": str(exc.detail),
+            "details": None,
+            "timestamp": format_utc(utc_now())
+        }
     )
 
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
-    logger.error(f"Unhandled exception: {exc}", exc_info=True)
-    return JSONResponse(
+    logger.error("Unhandled exception: %s", exc, exc_info=True)
+    return ORJSONResponse(
         status_code=500,
-        content=ErrorResponse(
-            error="InternalServerError",
-            message="An unexpected error occurred",
-            details={"type": type(exc).__name__}
-        ).model_dump(mode="json")
+        content={
+            "error": "InternalServerError",
+            "message": "An unexpected error occurred",
+            "details": {"type": type(exc).__name__},
+            "timestamp": format_utc(utc_now())
+        }
     )
 
 
@@ -169,20 +318,139 @@ async def general_exception_handler(request, exc):
 # Utility Functions
 # ============================================================================
 
-async def read_upload_file(upload_file: UploadFile) -> np.ndarray:
-    """Read and validate uploaded image file."""
-    max_size = config.max_upload_size
-    content = await upload_file.read()
+UPLOAD_CHUNK_SIZE = 256 * 1024  # Bytes read per iteration in read_upload_file
+
+_JPEG_SOF_MARKERS = frozenset((0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF))
+
+
+def _peek_image_size(content) -> Tuple[Optional[str], Optional[Tuple[int, int]]]:
+    """
+    Read (width, height) from a JPEG/PNG header without decoding pixels.
     
-    if len(content) > max_size:
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"File too large. Max size: {max_size / (1024*1024):.1f}MB"
-        )
+    Args:
+        content: Raw file bytes
+    
+    Returns:
+        Tuple of (format, (width, height)); format is "jpeg", "png" or None,
+        size is None when the header could not be parsed
+    """
+    if content[:8] == b"\x89PNG\r\n\x1a\n" and len(content) >= 24:
+        w = int.from_bytes(content[16:20], "big")
+        h = int.from_bytes(content[20:24], "big")
+        return "png", (w, h)
+    
+    if content[:2] != b"\xff\xd8":
+        return None, None
+    
+    # Walk JPEG segments until a start-of-frame marker
+    i, n = 2, len(content)
+    while i + 9 < n:
+        if content[i] != 0xFF:
+            return "jpeg", None
+        marker = content[i + 1]
+        if marker == 0xFF:  # Fill byte
+            i += 1
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            h = int.from_bytes(content[i + 5:i + 7], "big")
+            w = int.from_bytes(content[i + 7:i + 9], "big")
+            return "jpeg", (w, h)
+        i += 2 + int.from_bytes(content[i + 2:i + 4], "big")
+    return "jpeg", None
+
+
+def _imread_flag_for(fmt: Optional[str], size: Optional[Tuple[int, int]]) -> Tuple[int, int]:
+    """
+    Pick an imdecode flag that decodes JPEGs at a reduced scale when they are
+    far larger than the processing size. libjpeg skips the discarded DCT
+    coefficients, so this is much cheaper than a full decode + resize.
+    The reduced image is never smaller than _PROCESSING_MAX_DIM.
+    
+    Returns:
+        Tuple of (imdecode flag, reduction factor)
+    """
+    if fmt != "jpeg" or size is None:
+        return cv2.IMREAD_COLOR, 1
+    
+    longest = max(size)
+    if longest >= 8 * _PROCESSING_MAX_DIM:
+        return cv2.IMREAD_REDUCED_COLOR_8, 8
+    if longest >= 4 * _PROCESSING_MAX_DIM:
+        return cv2.IMREAD_REDUCED_COLOR_4, 4
+    if longest >= 2 * _PROCESSING_MAX_DIM:
+        return cv2.IMREAD_REDUCED_COLOR_2, 2
+    return cv2.IMREAD_COLOR, 1
+
+
+def _readinto_full(file, view: memoryview) -> int:
+    """Fill view from a binary file object; returns bytes read (< len(view) at EOF)."""
+    offset = 0
+    while offset < len(view):
+        n = file.readinto(view[offset:])
+        if not n:
+            break
+        offset += n
+    return offset
+
+
+async def read_upload_bytes(upload_file: UploadFile):
+    """
+    Read an uploaded file into memory, enforcing the upload size limit.
+    
+    Returns:
+        File contents as a bytes-like object (bytearray or memoryview)
+    """
+    max_size = _MAX_UPLOAD_SIZE
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File too large. Max size: {max_size / (1024*1024):.1f}MB"
+    )
+    
+    # Reject up front when the declared size is already over the limit
+    if upload_file.size is not None and upload_file.size > max_size:
+        raise too_large
     
+    if upload_file.size is not None:
+        # Size is known: read the spooled file straight into one preallocated buffer
+        buf = np.empty(upload_file.size, dtype=np.uint8)
+        n = await run_in_threadpool(_readinto_full, upload_file.file, memoryview(buf))
+        content = memoryview(buf)[:n]
+    else:
+        # Read incrementally so uploads without a declared size are still bounded mid-stream
+        content = bytearray()
+        total = 0
+        while chunk := await upload_file.read(UPLOAD_CHUNK_SIZE):
+            total += len(chunk)
+            if total > max_size:
+                raise too_large
+            content.extend(chunk)
+    
+    return content
+
+
+def decode_upload_image(content, reduce: bool = False) -> np.ndarray:
+    """
+    Decode and validate uploaded image bytes.
+    
+    Args:
+        content: Raw image bytes
+        reduce: Allow a reduced-scale JPEG decode (see _imread_flag_for). Only for
+                images used solely by the face detector/matcher; OCR inputs need full size.
+    """
     try:
-        nparr = np.frombuffer(content, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        fmt, header_size = _peek_image_size(content)
+        max_dim = _IMG_MAX_DIM
+        
+        # Reject oversize images from the header, before paying for the decode
+        if header_size is not None and max(header_size) > max_dim:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Image too large. Max dimension: {max_dim}px"
+            )
+        
+        flag, reduction = _imread_flag_for(fmt, header_size) if reduce else (cv2.IMREAD_COLOR, 1)
+        nparr = np.frombuffer(memoryview(content), np.uint8)
+        image = cv2.imdecode(nparr, flag)
         
         if image is None:
             raise HTTPException(
@@ -190,8 +458,8 @@ async def read_upload_file(upload_file: UploadFile) -> np.ndarray:
                 detail="Invalid image format. Supported: JPG, PNG"
             )
         
-        max_dim = config.get("upload", "image_max_dimension", default=4096)
-        h, w = image.shape[:2]
+        # Validate against the original dimensions (the decode may be reduced)
+        h, w = (d * reduction for d in image.shape[:2])
         
         # Log image dimensions for debugging
         logger.info(f"Image uploaded: {w}x{h} pixels, size: {len(content)/1024:.1f}KB")
@@ -223,54 +491,176 @@ async def read_upload_file(upload_file: UploadFile) -> np.ndarray:
         )
 
 
-def determine_verification_status(face_verified: bool, ocr_confidence: float, face_confidence: float = 0.0) -> VerificationStatus:
+async def read_upload_file(upload_file: UploadFile, reduce: bool = False) -> np.ndarray:
+    """Read and validate uploaded image file (reduce as for decode_upload_image)."""
+    return decode_upload_image(await read_upload_bytes(upload_file), reduce=reduce)
+
+
+# ============================================================================
+# OCR Result Cache
+# ============================================================================
+
+# Retries often resubmit the identical document photo; OCR is the slowest stage,
+# so results are kept briefly keyed by a hash of the uploaded bytes.
+# Only touched from the event loop, so no lock is needed.
+_OCR_CACHE_SIZE = int(config.get("verification", "ocr_cache_size", default=256))
+_OCR_CACHE_TTL = float(config.get("verification", "ocr_cache_ttl_seconds", default=300))
+_ocr_cache: "OrderedDict[bytes, Tuple[float, OCRResult]]" = OrderedDict()
+
+
+def ocr_cache_key(content) -> bytes:
+    """128-bit BLAKE2b digest of the raw upload bytes."""
+    return hashlib.blake2b(content, digest_size=16).digest()
+
+
+async def extract_ocr_cached(image: np.ndarray, cache_key: Optional[bytes]) -> "OCRResult":
     """
-    Determine overall verification status.
+    Run OCR on the ML executor, reusing a cached result for identical uploads.
+    
+    Args:
+        image: Decoded document image
+        cache_key: ocr_cache_key() of the upload, or None to bypass the cache
     
-    More lenient: If face match is decent (>= 0.35), approve even with low OCR confidence.
-    This handles cases where OCR fails but face matching is reliable.
+    Returns:
+        OCRResult
     """
-    if not face_verified:
-        return VerificationStatus.REJECTED
+    now = time.monotonic()
+    if cache_key is not None:
+        entry = _ocr_cache.get(cache_key)
+        if entry is not None:
+            expires_at, cached = entry
+            if expires_at > now:
+                _ocr_cache.move_to_end(cache_key)
+                logger.info("✓ OCR cache hit")
+                return cached
+            del _ocr_cache[cache_key]
     
-    # If face match confidence is decent (>= 0.35), approve even if OCR fails
-    # This is more lenient for cases where OCR can't read the document but face match is reliable
-    if face_confidence >= 0.35:
-        return VerificationStatus.APPROVED
+    result = await run_ml(ocr_extractor.extract_structured, image)
     
-    # If OCR confidence is decent (>= 0.5), approve regardless of face match score
-    if ocr_confidence >= 0.5:
-        return VerificationStatus.APPROVED
+    if cache_key is not None and _OCR_CACHE_SIZE > 0:
+        _ocr_cache[cache_key] = (time.monotonic() + _OCR_CACHE_TTL, result)
+        _ocr_cache.move_to_end(cache_key)
+        while len(_ocr_cache) > _OCR_CACHE_SIZE:
+            _ocr_cache.popitem(last=False)
     
-    # If both are low, pending for manual review
-    return VerificationStatus.PENDING
+    return result
+
 
+def downscale_image(image: np.ndarray, max_dim: int = _PROCESSING_MAX_DIM) -> np.ndarray:
+    """
+    Shrink image so its longest side is at most max_dim (aspect ratio kept).
+    Detectors resize internally anyway; doing it once up front cuts memory traffic.
+    Returns the input unchanged if it is already small enough.
+    """
+    h, w = image.shape[:2]
+    scale = min(1.0, max_dim / max(h, w))
+    if scale >= 1.0:
+        return image
+    
+    new_w, new_h = int(w * scale), int(h * scale)
+    logger.debug(f"Downscaled image for processing: {w}x{h} → {new_w}x{new_h}")
+    return cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_AREA)
+
+
+# OCRFields keys, computed once at import (all are Optional[str])
+_OCR_FIELD_KEYS = frozenset(OCRFields.model_fields)
+
+
+def _ocr_result_to_fields(ocr_result) -> OCRFields:
+    """
+    Build OCRFields from an OCRResult, materializing only the OCRFields keys.
+    All fields are Optional; missing or empty values are omitted by to_dict()
+    and default to None.
+    Uses model_construct: OCRResult is produced by our own extractor, so
+    re-validating it is wasted work.
+    """
+    return OCRFields.model_construct(**ocr_result.to_dict(only=_OCR_FIELD_KEYS))
 
-def calculate_confidence_score(
-    face_confidence: float,
+
+def detect_and_embed(*images: np.ndarray):
+    """
+    Detect the largest face in each image, crop it and extract all embeddings
+    in one batched recognition pass. Images are downscaled to the processing
+    size first (runs in the worker thread).
+    
+    Returns:
+        List of (FaceDetectionResult, embedding) per image, (None, None) where no face was found
+    """
+    face_results = face_detector.detect_and_extract_batch([downscale_image(img) for img in images])
+    embeddings = face_matcher.get_embeddings([r.face_crop if r is not None else None for r in face_results])
+    return [
+        (result, emb) if result is not None else (None, None)
+        for result, emb in zip(face_results, embeddings)
+    ]
+
+
+def check_face_duplicate(
+    embedding: np.ndarray,
+    enroll: bool,
+    profile_id: Optional[str] = None
+) -> Tuple[Optional[int], float]:
+    """
+    1:N check of a selfie embedding against previously enrolled faces.
+    The face is enrolled when enroll is True and no duplicate was found; search and
+    enrollment are one atomic step (FaceIndex.search_or_add).
+    
+    Args:
+        embedding: Selfie embedding
+        enroll: Enroll the face if it is not a duplicate
+        profile_id: Caller's profile id; the profile's own earlier enrollment is not a duplicate
+    
+    Returns:
+        Tuple of (matching entry id or None, best cosine similarity)
+    """
+    return face_index.search_or_add(embedding, _DUPLICATE_THRESHOLD, enroll, subject_id=profile_id)
+
+
+def _face_match_to_data(match_result) -> FaceMatchData:
+    """Build FaceMatchData from a FaceMatchResult without re-validation."""
+    details = match_result.to_dict()
+    return FaceMatchData.model_construct(
+        verified=details["verified"],
+        confidence=details["confidence"],
+        similarity_metrics=SimilarityMetrics.model_construct(**details["similarity_metrics"]),
+        threshold_used=details["threshold_used"],
+        message=details["message"]
+    )
+
+
+def _compute_status_and_score(
+    face_verified: bool,
     ocr_confidence: float,
-    face_verified: bool
-) -> float:
+    face_confidence: float = 0.0
+) -> Tuple[VerificationStatus, float]:
     """
-    Calculate overall confidence score (weighted: 60% face + 40% OCR).
-    Used by frontend for display.
+    Determine overall verification status and confidence score in one pass.
+    
+    Status is more lenient: if face match is decent (>= 0.35), approve even with
+    low OCR confidence. This handles cases where OCR fails but face matching is reliable.
+    Score is weighted 60% face + 40% OCR and is used by frontend for display.
     """
     if not face_verified:
-        return 0.0
+        return VerificationStatus.REJECTED, 0.0
     
     # Weighted average
-    return (0.6 * face_confidence) + (0.4 * ocr_confidence)
+    confidence_score = (0.6 * face_confidence) + (0.4 * ocr_confidence)
+    
+    # If face match confidence is decent (>= 0.35), approve even if OCR fails
+    # This is more lenient for cases where OCR can't read the document but face match is reliable
+    # If OCR confidence is decent (>= 0.5), approve regardless of face match score
+    if face_confidence >= 0.35 or ocr_confidence >= 0.5:
+        return VerificationStatus.APPROVED, confidence_score
+    
+    # If both are low, pending for manual review
+    return VerificationStatus.PENDING, confidence_score
 
 
 # ============================================================================
 # API Endpoints
 # ============================================================================
 
-@app.get("/api/v1/health", response_model=HealthCheckResponse, tags=["Health"])
-async def health_check():
-    """
-    Health check endpoint with model status.
-    """
+def _build_health_response() -> HealthCheckResponse:
+    """Build health check response from current model status."""
     models_status = {}
     
     # Check face detector
@@ -305,11 +695,47 @@ async def health_check():
     
     return HealthCheckResponse(
         status="healthy" if all_loaded else "degraded",
-        version=config.get("project", "version", default="1.0.0"),
+        version=_APP_VERSION,
         models=models_status
     )
 
 
+def _refresh_health_cache() -> None:
+    """
+    Serialize the health body once and derive its ETag.
+    Model status only changes at startup/shutdown, so probes reuse this.
+    """
+    global _health_body, _health_etag
+    _health_body = _build_health_response().model_dump(mode="json")
+    _health_etag = f'"{hashlib.sha1(orjson.dumps(_health_body)).hexdigest()}"'
+
+
+def _invalidate_health_cache() -> None:
+    """Drop cached health body (e.g. on shutdown)."""
+    global _health_body, _health_etag
+    _health_body = None
+    _health_etag = None
+
+
+@app.get("/api/v1/health", response_model=HealthCheckResponse, tags=["Health"])
+async def health_check(request: Request):
+    """
+    Health check endpoint with model status.
+    Served from a cached body; returns 304 when If-None-Match matches the ETag.
+    """
+    if _health_body is None:
+        # Not cached (startup not finished or shutting down) - report live status
+        return _build_health_response()
+    
+    if request.headers.get("if-none-match") == _health_etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": _health_etag})
+    
+    return ORJSONResponse(
+        _health_body,
+        headers={"ETag": _health_etag, "Cache-Control": "max-age=1"}
+    )
+
+
 @app.post(
     "/api/v1/kyc/verify",
     response_model=KYCVerificationResponse,
@@ -318,7 +744,8 @@ async def health_check():
 )
 async def verify_kyc(
     id_document: UploadFile = File(..., description="ID card/passport image"),
-    selfie_image: UploadFile = File(..., description="Selfie photo")
+    selfie_image: UploadFile = File(..., description="Selfie photo"),
+    profile_id: Optional[str] = Form(None, description="Caller's profile id (face_db: retries by the same profile are not duplicates)")
 ):
     """
     Complete KYC verification: face detection + matching + OCR.
@@ -331,86 +758,105 @@ async def verify_kyc(
             detail="Service not ready. Models still loading."
         )
     
-    async with processing_semaphore:
+    async with admission:
         try:
             logger.info("Reading uploaded files...")
-            id_image = await read_upload_file(id_document)
-            selfie_img = await read_upload_file(selfie_image)
-            
-            # Detect faces
-            logger.info("Detecting faces...")
-            id_face_result, selfie_face_result = await asyncio.gather(
-                asyncio.to_thread(face_detector.detect_and_extract, id_image),
-                asyncio.to_thread(face_detector.detect_and_extract, selfie_img)
-            )
-            
-            if id_face_result is None:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="No face detected in ID document. Please ensure: (1) Face is clearly visible, (2) Image is high resolution (minimum 640x480), (3) Face is not too small or far from camera, (4) Good lighting without glare."
-                )
+            id_content = await read_upload_bytes(id_document)
+            id_ocr_key = ocr_cache_key(id_content)
+            # Full-size decode: the ID image also feeds OCR
+            id_image = decode_upload_image(id_content)
+            del id_content
+            # The selfie only goes to the face detector/matcher
+            selfie_img = await read_upload_file(selfie_image, reduce=True)
             
-            if selfie_face_result is None:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="No face detected in selfie image. Please ensure: (1) Face is clearly visible and centered, (2) Image is high resolution, (3) Good lighting, (4) Face is not too small."
-                )
+            # OCR starts immediately unless it may be skipped for rejected faces
+            ocr_task = None
+            if not _SKIP_OCR_ON_REJECT:
+                ocr_task = asyncio.ensure_future(extract_ocr_cached(id_image, id_ocr_key))
             
-            # ✅ OPTIMIZATION: Run face matching and OCR in parallel
-            logger.info("Running face matching and OCR in parallel...")
             try:
-                match_result, ocr_result = await asyncio.gather(
-                    asyncio.to_thread(
-                        face_matcher.verify,
-                        id_face_result.face_crop,
-                        selfie_face_result.face_crop
-                    ),
-                    asyncio.to_thread(
-                        ocr_extractor.extract_structured,
-                        id_image
-                    ),
-                    return_exceptions=True  # Don't fail entire request if one fails
-                )
-                
-                # Check if face matching failed
-                if isinstance(match_result, Exception):
-                    logger.error(f"Face matching failed: {match_result}")
+                # ✅ OPTIMIZATION: One thread hop for both images (detect + crop + batched embed)
+                # Detectors get downscaled copies; OCR keeps the full-resolution ID image
+                logger.info("Detecting faces and extracting embeddings...")
+                try:
+                    id_faces, selfie_faces = await run_ml(detect_and_embed, id_image, selfie_img)
+                except Exception as e:
+                    logger.error(f"Face matching failed: {e}")
                     raise HTTPException(
                         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                        detail=f"Face matching failed: {str(match_result)}"
+                        detail=f"Face matching failed: {str(e)}"
                     )
                 
-                # Check if OCR failed (PaddlePaddle segfault protection)
-                if isinstance(ocr_result, Exception):
-                    logger.error(f"OCR extraction failed: {ocr_result}")
+                id_face_result, id_embedding = id_faces
+                selfie_face_result, selfie_embedding = selfie_faces
+                
+                if id_face_result is None:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="No face detected in ID document. Please ensure: (1) Face is clearly visible, (2) Image is high resolution (minimum 640x480), (3) Face is not too small or far from camera, (4) Good lighting without glare."
+                    )
+                
+                # An unusable ID face rejects the request before any OCR is dispatched
+                if id_face_result.confidence < _MIN_ID_FACE_CONFIDENCE:
+                    logger.warning(f"ID face confidence too low: {id_face_result.confidence:.3f} < {_MIN_ID_FACE_CONFIDENCE}")
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="Face in ID document is not clear enough. Please upload a sharper, well-lit image of the document."
+                    )
+                
+                if selfie_face_result is None:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="No face detected in selfie image. Please ensure: (1) Face is clearly visible and centered, (2) Image is high resolution, (3) Good lighting, (4) Face is not too small."
+                    )
+                
+                # Cosine match on two 512-d vectors is sub-millisecond - no thread hop needed
+                match_result = face_matcher.verify_embeddings(id_embedding, selfie_embedding)
+                
+                if face_index is not None:
+                    duplicate_id, duplicate_score = await run_ml(
+                        check_face_duplicate, selfie_embedding, match_result.verified, profile_id
+                    )
+                    if duplicate_id is not None:
+                        logger.warning(f"⚠ Selfie matches enrolled face #{duplicate_id} (similarity: {duplicate_score:.4f})")
+                
+                # Drop full-size pixels as soon as they are no longer needed, rather than holding
+                # them in this coroutine frame until the response is sent (id_image may still feed OCR)
+                del selfie_img, id_faces, selfie_faces, id_face_result, selfie_face_result
+                del id_embedding, selfie_embedding
+                
+                # A face mismatch is always REJECTED, so OCR would not change the decision
+                ocr_result = None
+                try:
+                    if ocr_task is not None:
+                        ocr_result = await ocr_task
+                    elif match_result.verified:
+                        logger.info("Faces match - running OCR...")
+                        ocr_result = await extract_ocr_cached(id_image, id_ocr_key)
+                    else:
+                        logger.info("Faces do not match - skipping OCR")
+                except Exception as e:
+                    # PaddlePaddle segfault protection
+                    logger.error(f"OCR extraction failed: {e}")
                     raise HTTPException(
                         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                         detail="OCR extraction failed. Please try with a clearer document image or try again."
                     )
-                
-            except HTTPException:
-                raise
-            except Exception as e:
-                logger.error(f"Parallel processing failed: {e}", exc_info=True)
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Processing failed: {str(e)}"
-                )
+            finally:
+                if ocr_task is not None and not ocr_task.done():
+                    ocr_task.cancel()
             
-            # Determine verification status
-            verification_status = determine_verification_status(
+            del id_image
+            
+            ocr_confidence = ocr_result.confidence if ocr_result is not None else 0.0
+            
+            # Determine verification status + overall confidence score for frontend
+            verification_status, confidence_score = _compute_status_and_score(
                 face_verified=match_result.verified,
-                ocr_confidence=ocr_result.confidence,
+                ocr_confidence=ocr_confidence,
                 face_confidence=match_result.confidence
             )
             
-            # ✅ FIX #2: Calculate overall confidence score for frontend
-            confidence_score = calculate_confidence_score(
-                face_confidence=match_result.confidence,
-                ocr_confidence=ocr_result.confidence,
-                face_verified=match_result.verified
-            )
-            
             processing_time_ms = int((time.time() - start_time) * 1000)
             
             # Log detailed face matching info for debugging
@@ -423,38 +869,31 @@ async def verify_kyc(
             
             # Convert OCRResult to OCRData (Pydantic model)
             # All fields are Optional, so missing fields will be None - this handles documents with incomplete data
-            ocr_fields = OCRFields(
-                full_name=ocr_result.full_name,
-                date_of_birth=ocr_result.date_of_birth,
-                document_number=ocr_result.document_number,
-                nationality=ocr_result.nationality,
-                issue_date=ocr_result.issue_date,
-                expiry_date=ocr_result.expiry_date,
-                place_of_birth=ocr_result.place_of_birth,
-                address=ocr_result.address,
-                gender=ocr_result.gender
-            )
-            
-            ocr_data = OCRData(
-                document_type=ocr_result.document_type,
-                confidence=ocr_result.confidence,
-                extracted_text=ocr_result.extracted_text,
-                fields=ocr_fields
-            )
+            ocr_data = None
+            if ocr_result is not None:
+                ocr_data = OCRData.model_construct(
+                    document_type=ocr_result.document_type,
+                    confidence=ocr_result.confidence,
+                    extracted_text=ocr_result.extracted_text,
+                    fields=_ocr_result_to_fields(ocr_result)
+                )
             
-            return KYCVerificationResponse(
+            # Trusted internal data: skip validation and hand orjson a plain dict,
+            # bypassing FastAPI's response_model re-validation + jsonable_encoder pass
+            response = KYCVerificationResponse.model_construct(
                 verification_status=verification_status,
                 confidence_score=confidence_score,
                 face_match_score=match_result.confidence,  # This is normalized_score, not cosine_similarity
                 ocr_data=ocr_data,
                 processing_time_ms=processing_time_ms,
-                face_verification_details=match_result.to_dict()
+                face_verification_details=_face_match_to_data(match_result)
             )
+            return ORJSONResponse(response.model_dump(mode="json"))
         
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Verification error: {e}", exc_info=True)
+            logger.error("Verification error: %s", e, exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Verification failed: {str(e)}"
@@ -481,39 +920,36 @@ async def extract_ocr(
             detail="OCR service not ready. Models still loading."
         )
     
-    async with processing_semaphore:
+    async with admission:
         try:
             logger.info("Reading uploaded document...")
-            doc_image = await read_upload_file(document)
+            doc_content = await read_upload_bytes(document)
+            doc_ocr_key = ocr_cache_key(doc_content)
+            doc_image = decode_upload_image(doc_content)  # Full size for OCR
+            del doc_content
             
             logger.info("Extracting OCR...")
-            ocr_result = await asyncio.to_thread(
-                ocr_extractor.extract_structured,
-                doc_image
-            )
+            ocr_result = await extract_ocr_cached(doc_image, doc_ocr_key)
             
             processing_time_ms = int((time.time() - start_time) * 1000)
             
-            response = OCROnlyResponse(
-                ocr_data=OCRData(
+            response = OCROnlyResponse.model_construct(
+                ocr_data=OCRData.model_construct(
                     document_type=ocr_result.document_type,
                     confidence=ocr_result.confidence,
                     extracted_text=ocr_result.extracted_text,
-                    fields=OCRFields(**{
-                        k: v for k, v in ocr_result.to_dict().items()
-                        if k in OCRFields.model_fields
-                    })
+                    fields=_ocr_result_to_fields(ocr_result)
                 ),
                 processing_time_ms=processing_time_ms
             )
             
             logger.info(f"✓ OCR extraction complete ({processing_time_ms}ms)")
-            return response
+            return ORJSONResponse(response.model_dump(mode="json"))
         
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"OCR error: {e}", exc_info=True)
+            logger.error("OCR error: %s", e, exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"OCR extraction failed: {str(e)}"
@@ -524,6 +960,37 @@ async def extract_ocr(
 # Liveness Detection Endpoints
 # ============================================================================
 
+# Optional GPU JPEG decoding (nvImageCodec). Only attempted when enabled in config;
+# any import/init failure falls back to cv2.imdecode on CPU.
+_nv_decoder = None
+if config.get("processing", "gpu_image_decode", default=False):
+    try:
+        from nvidia import nvimgcodec
+        _nv_decoder = nvimgcodec.Decoder()
+        logger.info("✓ nvImageCodec GPU image decoding enabled")
+    except Exception as nv_error:
+        logger.warning(f"nvImageCodec unavailable, using CPU decoding: {nv_error}")
+
+
+def _decode_image_gpu(image_data: bytes) -> Optional[np.ndarray]:
+    """Decode encoded image bytes on the GPU. Returns BGR on host, or None on failure."""
+    try:
+        nv_image = _nv_decoder.decode(image_data)
+        if nv_image is None:
+            return None
+        # Downstream detectors are CPU-bound, so copy to host once (nvImageCodec yields RGB)
+        return cv2.cvtColor(np.asarray(nv_image.cpu()), cv2.COLOR_RGB2BGR)
+    except Exception as e:
+        logger.debug(f"GPU decode failed, falling back to CPU: {e}")
+        return None
+
+
+# Liveness frames come from a browser canvas/video capture and carry no EXIF orientation,
+# so skip the EXIF parse. Uploaded photos keep it: YuNet is not rotation-invariant and
+# phone selfies often rely on the EXIF tag to be upright.
+_FRAME_IMREAD_FLAGS = cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
+
+
 def decode_base64_image(base64_str: str) -> np.ndarray:
     """
     Decode base64 image string to numpy array.
@@ -534,32 +1001,12 @@ def decode_base64_image(base64_str: str) -> np.ndarray:
     Returns:
         Decoded image as numpy array (BGR format)
     """
-    import base64
-    from io import BytesIO
-    from PIL import Image
-    
     # Remove data URI prefix if present
     if ',' in base64_str:
-        base64_str = base64_str.split(',')[1]
+        base64_str = base64_str.split(',', 1)[1]
     
     try:
-        # Decode base64
-        image_data = base64.b64decode(base64_str)
-        
-        # Convert to PIL Image
-        pil_image = Image.open(BytesIO(image_data))
-        
-        # Convert to RGB if needed
-        if pil_image.mode != 'RGB':
-            pil_image = pil_image.convert('RGB')
-        
-        # Convert to numpy array (RGB)
-        img_array = np.array(pil_image)
-        
-        # Convert RGB to BGR for OpenCV
-        img_bgr = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-        
-        return img_bgr
+        return decode_image_bytes(_b64.b64decode(base64_str))
     
     except Exception as e:
         logger.error(f"Base64 decode error: {e}")
@@ -569,6 +1016,79 @@ def decode_base64_image(base64_str: str) -> np.ndarray:
         )
 
 
+def decode_image_bytes(image_data) -> np.ndarray:
+    """
+    Decode an encoded (JPEG/PNG) liveness frame to a BGR numpy array.
+    
+    Raises:
+        ValueError: If the data is not a decodable image
+    """
+    img_bgr = _decode_image_gpu(image_data) if _nv_decoder is not None else None
+    
+    if img_bgr is None:
+        # cv2.imdecode returns BGR directly - no PIL round-trip or RGB->BGR conversion
+        nparr = np.frombuffer(image_data, dtype=np.uint8)
+        img_bgr = cv2.imdecode(nparr, _FRAME_IMREAD_FLAGS)
+    
+    if img_bgr is None:
+        raise ValueError("Unsupported or corrupt image data")
+    
+    return img_bgr
+
+
+def decode_batch(frames: list, decoder=decode_base64_image) -> list:
+    """
+    Decode a slice of frames in one worker call.
+    
+    Args:
+        frames: Encoded frames (base64 strings or raw image bytes)
+        decoder: decode_base64_image or decode_image_bytes
+    
+    Returns:
+        One entry per input frame: the decoded BGR image, or the exception raised
+    """
+    decoded = []
+    for frame in frames:
+        try:
+            decoded.append(decoder(frame))
+        except Exception as e:
+            decoded.append(e)
+    return decoded
+
+
+async def decode_frames(frames: list, decoder=decode_base64_image) -> list:
+    """
+    Decode frames in parallel on the frame decode pool.
+    Frames are split into one contiguous batch per worker, so a 30-frame request
+    costs DECODE_WORKERS executor round-trips instead of 30.
+    Frames that fail to decode are logged and skipped.
+    """
+    loop = asyncio.get_running_loop()
+    batch_size = max(1, -(-len(frames) // DECODE_WORKERS))  # ceil division
+    futures = [
+        loop.run_in_executor(frame_decode_executor, decode_batch, frames[i:i + batch_size], decoder)
+        for i in range(0, len(frames), batch_size)
+    ]
+    batches = await asyncio.gather(*futures)
+    
+    decoded_frames = []
+    for i, frame in enumerate(f for batch in batches for f in batch):
+        if isinstance(frame, Exception):
+            logger.warning(f"Failed to decode frame {i}: {frame}")
+            continue
+        decoded_frames.append(frame)
+    
+    return decoded_frames
+
+
+async def read_frame_uploads(files: List[UploadFile]) -> list:
+    """Read raw multipart frame uploads, enforcing the per-file upload size limit."""
+    blobs = []
+    for f in files:
+        blobs.append(await read_upload_bytes(f))
+    return blobs
+
+
 @app.get(
     "/api/v1/liveness/challenge",
     response_model=ChallengeResponse,
@@ -580,8 +1100,6 @@ async def generate_challenge():
     Returns a challenge that the user must complete (blink, turn left, turn right).
     """
     try:
-        from app.services.liveness_challenges import get_challenge_generator
-        
         generator = get_challenge_generator()
         challenge = generator.generate_challenge()
         
@@ -590,13 +1108,48 @@ async def generate_challenge():
         return ChallengeResponse(**challenge.to_dict())
     
     except Exception as e:
-        logger.error(f"Challenge generation error: {e}", exc_info=True)
+        logger.error("Challenge generation error: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to generate challenge: {str(e)}"
         )
 
 
+async def _verify_decoded_frames(challenge_id: str, decoded_frames: list, start_time: float):
+    """
+    Run challenge verification on already-decoded frames and build the response.
+    Shared by the base64 (JSON) and multipart liveness verify endpoints.
+    """
+    if len(decoded_frames) == 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Failed to decode any frames"
+        )
+    
+    # Verify challenge
+    status_result, message, results = await run_ml(
+        liveness_detector.verify_challenge,
+        challenge_id,
+        decoded_frames,
+        0,  # initial_counter
+        0   # initial_total
+    )
+    
+    processing_time_ms = int((time.time() - start_time) * 1000)
+    
+    logger.info(f"Challenge verification: {status_result.value} - {message}")
+    
+    # Trusted internal data: construct without validation, serialize once with orjson
+    response = LivenessVerificationResponse.model_construct(
+        challenge_id=challenge_id,
+        status=ChallengeStatus(status_result.value),  # Service enum -> schema enum (model_construct skips coercion)
+        message=message,
+        detection_results=results.get("detection_results", {}),
+        processing_time_ms=processing_time_ms
+    )
+    return ORJSONResponse(response.model_dump(mode="json"))
+
+
 @app.post(
     "/api/v1/liveness/verify",
     response_model=LivenessVerificationResponse,
@@ -616,7 +1169,7 @@ async def verify_liveness_challenge(request: LivenessVerificationRequest):
             detail="Liveness detector not available. Service may still be loading."
         )
     
-    async with processing_semaphore:
+    async with admission:
         try:
             # Validate request
             if not request.frames or len(request.frames) == 0:
@@ -625,7 +1178,7 @@ async def verify_liveness_challenge(request: LivenessVerificationRequest):
                     detail="No frames provided"
                 )
             
-            min_frames = config.get("liveness", "detection", "min_frames", default=10)
+            min_frames = _MIN_FRAMES
             if len(request.frames) < min_frames:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -634,50 +1187,148 @@ async def verify_liveness_challenge(request: LivenessVerificationRequest):
             
             logger.info(f"Verifying challenge {request.challenge_id} with {len(request.frames)} frames...")
             
-            # Decode base64 frames
-            decoded_frames = []
-            for i, frame_str in enumerate(request.frames):
-                try:
-                    frame = decode_base64_image(frame_str)
-                    decoded_frames.append(frame)
-                except Exception as e:
-                    logger.warning(f"Failed to decode frame {i}: {e}")
-                    # Continue with other frames
+            # Decode base64 frames (in parallel, failed frames are skipped)
+            decoded_frames = await decode_frames(request.frames)
             
-            if len(decoded_frames) == 0:
+            return await _verify_decoded_frames(request.challenge_id, decoded_frames, start_time)
+        
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error("Liveness verification error: %s", e, exc_info=True)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Liveness verification failed: {str(e)}"
+            )
+
+
+@app.post(
+    "/api/v1/liveness/verify-upload",
+    response_model=LivenessVerificationResponse,
+    responses={400: {"model": ErrorResponse}, 500: {"model": ErrorResponse}},
+    tags=["Liveness"]
+)
+async def verify_liveness_challenge_upload(
+    challenge_id: str = Form(..., description="Challenge ID to verify"),
+    frames: List[UploadFile] = File(..., description="Captured frames as raw JPEG/PNG files")
+):
+    """
+    Verify a liveness challenge with frames sent as multipart file uploads.
+    Same result as /liveness/verify, without base64: ~25% smaller requests and
+    no JSON string parsing or base64 decode per frame.
+    """
+    start_time = time.time()
+    
+    if liveness_detector is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Liveness detector not available. Service may still be loading."
+        )
+    
+    async with admission:
+        try:
+            min_frames = _MIN_FRAMES
+            if len(frames) < min_frames:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Failed to decode any frames"
+                    detail=f"Not enough frames. Minimum: {min_frames}, received: {len(frames)}"
                 )
             
-            # Verify challenge
-            status_result, message, results = await asyncio.to_thread(
-                liveness_detector.verify_challenge,
-                request.challenge_id,
-                decoded_frames,
-                0,  # initial_counter
-                0   # initial_total
+            logger.info(f"Verifying challenge {challenge_id} with {len(frames)} uploaded frames...")
+            
+            # Decode raw frames (in parallel, failed frames are skipped)
+            blobs = await read_frame_uploads(frames)
+            decoded_frames = await decode_frames(blobs, decoder=decode_image_bytes)
+            del blobs
+            
+            return await _verify_decoded_frames(challenge_id, decoded_frames, start_time)
+        
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error("Liveness verification error: %s", e, exc_info=True)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Liveness verification failed: {str(e)}"
+            )
+
+
+@app.post(
+    "/api/v1/liveness/verify-batch",
+    response_model=LivenessVerificationBatchResponse,
+    responses={400: {"model": ErrorResponse}, 500: {"model": ErrorResponse}},
+    tags=["Liveness"]
+)
+async def verify_liveness_challenge_batch(request: LivenessVerificationBatchRequest):
+    """
+    Verify several liveness challenges in one request.
+    Challenge lookups and response validation run once for the whole batch
+    (one Redis MGET with the shared challenge store); each item gets its own result.
+    """
+    start_time = time.time()
+    
+    if liveness_detector is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Liveness detector not available. Service may still be loading."
+        )
+    
+    if not request.items:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No challenges provided"
+        )
+    
+    if len(request.items) > _MAX_VERIFY_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many challenges. Maximum: {_MAX_VERIFY_BATCH}, received: {len(request.items)}"
+        )
+    
+    for i, item in enumerate(request.items):
+        if len(item.frames) < _MIN_FRAMES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Not enough frames for item {i}. Minimum: {_MIN_FRAMES}, received: {len(item.frames)}"
             )
+    
+    async with admission:
+        try:
+            logger.info(f"Verifying {len(request.items)} challenges in one batch...")
             
-            processing_time_ms = int((time.time() - start_time) * 1000)
+            # Decode every item's frames (in parallel, failed frames are skipped)
+            decoded = await asyncio.gather(*(decode_frames(item.frames) for item in request.items))
+            
+            outcomes = await run_ml(
+                liveness_detector.verify_challenges,
+                [(item.challenge_id, frames) for item, frames in zip(request.items, decoded)]
+            )
             
-            logger.info(f"Challenge verification: {status_result.value} - {message}")
+            processing_time_ms = int((time.time() - start_time) * 1000)
             
-            return LivenessVerificationResponse(
-                challenge_id=request.challenge_id,
-                status=status_result,
-                message=message,
-                detection_results=results.get("detection_results", {}),
+            # Trusted internal data: construct without validation, serialize once with orjson
+            response = LivenessVerificationBatchResponse.model_construct(
+                results=[
+                    LivenessVerificationResponse.model_construct(
+                        challenge_id=item.challenge_id,
+                        status=ChallengeStatus(status_result.value),  # Service enum -> schema enum (model_construct skips coercion)
+                        message=message,
+                        detection_results=results.get("detection_results", {}),
+                        processing_time_ms=processing_time_ms
+                    )
+                    for item, (status_result, message, results) in zip(request.items, outcomes)
+                ],
                 processing_time_ms=processing_time_ms
             )
+            return ORJSONResponse(response.model_dump(mode="json"))
         
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Liveness verification error: {e}", exc_info=True)
+            logger.error("Liveness batch verification error: %s", e, exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Liveness verification failed: {str(e)}"
+                detail=f"Liveness batch verification failed: {str(e)}"
             )
 
 
@@ -700,7 +1351,7 @@ async def detect_liveness_batch(request: LivenessBatchRequest):
             detail="Liveness detector not available. Service may still be loading."
         )
     
-    async with processing_semaphore:
+    async with admission:
         try:
             # Validate request
             if not request.frames or len(request.frames) == 0:
@@ -711,15 +1362,8 @@ async def detect_liveness_batch(request: LivenessBatchRequest):
             
             logger.info(f"Processing batch liveness detection with {len(request.frames)} frames...")
             
-            # Decode base64 frames
-            decoded_frames = []
-            for i, frame_str in enumerate(request.frames):
-                try:
-                    frame = decode_base64_image(frame_str)
-                    decoded_frames.append(frame)
-                except Exception as e:
-                    logger.warning(f"Failed to decode frame {i}: {e}")
-                    # Continue with other frames
+            # Decode base64 frames (in parallel, failed frames are skipped)
+            decoded_frames = await decode_frames(request.frames)
             
             if len(decoded_frames) == 0:
                 raise HTTPException(
@@ -728,7 +1372,7 @@ async def detect_liveness_batch(request: LivenessBatchRequest):
                 )
             
             # Detect liveness
-            batch_results = await asyncio.to_thread(
+            batch_results = await run_ml(
                 liveness_detector.detect_batch,
                 decoded_frames,
                 0,  # initial_counter
@@ -737,7 +1381,8 @@ async def detect_liveness_batch(request: LivenessBatchRequest):
             
             processing_time_ms = int((time.time() - start_time) * 1000)
             
-            return LivenessBatchResponse(
+            # Per-frame results can be hundreds of dicts: skip validation + jsonable_encoder
+            response = LivenessBatchResponse.model_construct(
                 total_blinks=batch_results.get("total_blinks", 0),
                 final_blink_count=batch_results.get("final_blink_count", 0),
                 orientations=batch_results.get("orientations", []),
@@ -746,11 +1391,12 @@ async def detect_liveness_batch(request: LivenessBatchRequest):
                 frame_count=batch_results.get("frame_count", len(decoded_frames)),
                 processing_time_ms=processing_time_ms
             )
+            return ORJSONResponse(response.model_dump(mode="json"))
         
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Batch liveness detection error: {e}", exc_info=True)
+            logger.error("Batch liveness detection error: %s", e, exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Batch liveness detection failed: {str(e)}"
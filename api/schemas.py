@@ -5,12 +5,31 @@ Pydantic schemas for KYC API - FIXED for Ballerine frontend compatibility.
 Added confidence_score field as required by frontend.
 """
 
-from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any, List
-from datetime import datetime
+from pydantic import BaseModel, Field, PlainSerializer, field_validator
+from typing import Annotated, Optional, Dict, Any, List
+from datetime import datetime, timezone
 from enum import Enum
 
 
+def utc_now() -> datetime:
+    """Timezone-aware UTC timestamp (datetime.utcnow() is deprecated)."""
+    return datetime.now(timezone.utc)
+
+
+def format_utc(dt: datetime) -> str:
+    """
+    Serialize a UTC timestamp in the API's wire format: ISO 8601 without an offset
+    (e.g. "2024-11-14T12:00:00.123456"), as the naive utcnow() timestamps were.
+    """
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.isoformat()
+
+
+# Aware UTC datetime in Python, offset-free ISO string on the wire
+UtcDatetime = Annotated[datetime, PlainSerializer(format_utc, return_type=str, when_used="json")]
+
+
 class VerificationStatus(str, Enum):
     """Verification status for KYC workflow."""
     APPROVED = "approved"
@@ -89,9 +108,12 @@ class KYCVerificationResponse(BaseModel):
         description="Face matching confidence (0-1)"
     )
     
-    ocr_data: OCRData = Field(description="OCR extraction results")
+    ocr_data: Optional[OCRData] = Field(
+        default=None,
+        description="OCR extraction results; null when faces do not match and verification.skip_ocr_on_reject is true (default)"
+    )
     processing_time_ms: int = Field(description="Total processing time in milliseconds")
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: UtcDatetime = Field(default_factory=utc_now)
     
     # Optional detailed breakdown
     face_verification_details: Optional[FaceMatchData] = None
@@ -138,7 +160,7 @@ class OCROnlyResponse(BaseModel):
     """Response for OCR-only endpoint."""
     ocr_data: OCRData
     processing_time_ms: int
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: UtcDatetime = Field(default_factory=utc_now)
 
     class Config:
         json_schema_extra = {
@@ -167,7 +189,7 @@ class ErrorResponse(BaseModel):
     error: str = Field(description="Error type")
     message: str = Field(description="Human-readable error message")
     details: Optional[Dict[str, Any]] = None
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: UtcDatetime = Field(default_factory=utc_now)
 
     class Config:
         json_schema_extra = {
@@ -196,7 +218,7 @@ class HealthCheckResponse(BaseModel):
     status: str = Field(description="Overall service status: healthy|degraded|unhealthy")
     version: str
     models: Dict[str, ModelStatus]
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: UtcDatetime = Field(default_factory=utc_now)
 
     class Config:
         json_schema_extra = {
@@ -299,7 +321,7 @@ class LivenessVerificationResponse(BaseModel):
     message: str = Field(description="Human-readable result message")
     detection_results: Dict[str, Any] = Field(description="Detailed detection results")
     processing_time_ms: int = Field(description="Processing time in milliseconds")
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: UtcDatetime = Field(default_factory=utc_now)
 
     class Config:
         json_schema_extra = {
@@ -319,6 +341,39 @@ class LivenessVerificationResponse(BaseModel):
         }
 
 
+class LivenessVerificationBatchRequest(BaseModel):
+    """Request to verify several liveness challenges in one call."""
+    items: List[LivenessVerificationRequest] = Field(description="Challenges to verify, each with its own frames")
+
+    @field_validator("items")
+    @classmethod
+    def _unique_challenge_ids(cls, items: List[LivenessVerificationRequest]) -> List[LivenessVerificationRequest]:
+        # Challenges are single use: the same id twice in one batch would be a replay
+        ids = [item.challenge_id for item in items]
+        if len(set(ids)) != len(ids):
+            raise ValueError("Duplicate challenge_id in batch")
+        return items
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "items": [
+                    {
+                        "challenge_id": "550e8400-e29b-41d4-a716-446655440000",
+                        "frames": ["data:image/jpeg;base64,/9j/4AAQ...", "data:image/jpeg;base64,/9j/4AAQ..."]
+                    }
+                ]
+            }
+        }
+
+
+class LivenessVerificationBatchResponse(BaseModel):
+    """Batch liveness challenge verification response."""
+    results: List[LivenessVerificationResponse] = Field(description="Per-challenge results, in request order")
+    processing_time_ms: int = Field(description="Processing time in milliseconds")
+    timestamp: UtcDatetime = Field(default_factory=utc_now)
+
+
 class LivenessBatchRequest(BaseModel):
     """Request for batch liveness detection (without challenge)."""
     frames: list = Field(description="Base64-encoded image frames (list of strings)")
@@ -342,7 +397,7 @@ class LivenessBatchResponse(BaseModel):
     results: list = Field(description="Per-frame detection results")
     frame_count: int = Field(description="Number of frames processed")
     processing_time_ms: int = Field(description="Processing time in milliseconds")
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: UtcDatetime = Field(default_factory=utc_now)
 
     class Config:
         json_schema_extra = {
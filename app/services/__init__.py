@@ -0,0 +1,32 @@
+# app/services/__init__.py
+
+"""
+ML services package.
+Singleton getters are resolved lazily (PEP 562) so importing the package
+does not pull in onnxruntime/insightface/paddleocr/mediapipe.
+"""
+
+import importlib
+
+_LAZY_ATTRS = {
+    "get_face_detector": "app.services.face_detector_id",
+    "get_face_matcher": "app.services.face_matcher",
+    "get_ocr_extractor": "app.services.ocr_extractor",
+    "get_liveness_detector": "app.services.liveness_detector",
+    "get_challenge_generator": "app.services.liveness_challenges",
+    "get_face_index": "app.services.face_db",
+}
+
+
+def __getattr__(name: str):
+    """Import the owning service module on first attribute access."""
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_ATTRS))
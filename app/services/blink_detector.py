@@ -7,9 +7,9 @@ Replaced dlib with MediaPipe for better Railway deployment compatibility.
 """
 
 import cv2
+import logging
 import numpy as np
 from typing import Optional, Tuple, Dict
-from scipy.spatial import distance as dist
 import threading
 import mediapipe as mp
 from mediapipe.python.solutions import face_mesh
@@ -17,9 +17,41 @@ from mediapipe.python.solutions import face_mesh
 from configs.config import config
 from utils.logger import get_logger
 
+try:
+    from numba import njit
+except ImportError:  # Optional dependency - the state machine then runs as plain Python
+    def njit(*args, **kwargs):
+        return lambda fn: fn
+
 logger = get_logger(__name__, log_file="liveness.log")
 
 
+@njit(cache=True)
+def _run_blink_fsm(closed, has_face, consecutive_frames, counter, total):
+    """
+    Blink counter state machine over a frame sequence.
+    Frames without a face leave the state untouched; a blink is counted on the
+    first open-eye frame after at least consecutive_frames closed frames.
+    
+    Returns:
+        Tuple of (blink_frames, final_counter, final_total)
+    """
+    blink_frames = np.empty(closed.shape[0], dtype=np.int64)
+    n_blinks = 0
+    for i in range(closed.shape[0]):
+        if not has_face[i]:
+            continue
+        if closed[i]:
+            counter += 1
+        else:
+            if counter >= consecutive_frames:
+                total += 1
+                blink_frames[n_blinks] = i
+                n_blinks += 1
+            counter = 0
+    return blink_frames[:n_blinks], counter, total
+
+
 class BlinkDetector:
     """
     Blink detection using MediaPipe FaceMesh.
@@ -33,12 +65,15 @@ class BlinkDetector:
     LEFT_EYE_INDICES = [33, 160, 158, 133, 153, 144]  # [outer, top_left, top_right, inner, bottom_inner, bottom_outer]
     # Right eye (from camera perspective)  
     RIGHT_EYE_INDICES = [362, 385, 387, 263, 373, 380]  # [outer, top_left, top_right, inner, bottom_inner, bottom_outer]
+    _EYE_INDICES = tuple(LEFT_EYE_INDICES + RIGHT_EYE_INDICES)
+    _MAX_EYE_INDEX = max(_EYE_INDICES)
     
     def __init__(
         self,
         ear_threshold: Optional[float] = None,
         consecutive_frames: Optional[int] = None,
-        min_detection_confidence: float = 0.5
+        min_detection_confidence: float = 0.5,
+        max_input_dim: Optional[int] = None
     ):
         """
         Initialize MediaPipe FaceMesh for blink detection.
@@ -47,6 +82,7 @@ class BlinkDetector:
             ear_threshold: Eye Aspect Ratio threshold for blink detection (default from config)
             consecutive_frames: Frames below threshold to count as blink (default from config)
             min_detection_confidence: Minimum confidence for face detection
+            max_input_dim: Long-side limit for frames fed to FaceMesh (default from config, 0 = off)
         """
         # Get thresholds from config
         if ear_threshold is None:
@@ -55,15 +91,24 @@ class BlinkDetector:
         if consecutive_frames is None:
             consecutive_frames = config.get("liveness", "blink", "consecutive_frames", default=1)
         
+        if max_input_dim is None:
+            max_input_dim = config.get("liveness", "blink", "max_input_dim", default=480)
+        
         self.ear_threshold = ear_threshold
         self.consecutive_frames = consecutive_frames
+        self.max_input_dim = max_input_dim
+        self._rgb_buf: Optional[np.ndarray] = None  # Reused BGR->RGB output buffer
+        self._eye_buf = np.empty((2, 6, 2))  # Scratch eye landmarks for single-frame EAR
         
         # Initialize MediaPipe FaceMesh
+        # (BlazeFace face_detection alone isn't enough: its 6 keypoints give eye centres,
+        # not the eyelid points EAR needs. With static_image_mode=False the mesh tracks
+        # from the previous frame's landmarks and only re-runs BlazeFace when tracking is lost.)
         self.mp_face_mesh = mp.solutions.face_mesh
         self.face_mesh = self.mp_face_mesh.FaceMesh(
             static_image_mode=False,
             max_num_faces=1,  # Only detect one face for liveness
-            refine_landmarks=True,  # Get more accurate landmarks
+            refine_landmarks=False,  # EAR uses base 468-mesh points only; iris/lip refinement is wasted work
             min_detection_confidence=min_detection_confidence,
             min_tracking_confidence=0.5
         )
@@ -86,36 +131,40 @@ class BlinkDetector:
         if eye_landmarks is None or len(eye_landmarks) < 6:
             return 1.0  # Return high value (eyes open) if insufficient points
         
+        return float(self.eye_aspect_ratios(np.asarray(eye_landmarks)[None, :6])[0])
+    
+    def eye_aspect_ratios(self, eyes: np.ndarray) -> np.ndarray:
+        """
+        Calculate EAR for several eyes at once (e.g. both eyes of a frame).
+        
+        Points order per eye: [outer_corner(0), top_left(1), top_right(2), inner_corner(3), bottom_inner(4), bottom_outer(5)]
+        Vertical distances: 1->5 and 2->4; horizontal distance: 0->3.
+        
+        Args:
+            eyes: Array of shape (n_eyes, 6, 2) in pixel coordinates
+        
+        Returns:
+            Array of n_eyes EAR values (1.0 where the eye is degenerate or on failure)
+        """
         try:
-            # Extract the 6 eye points
-            eye_points = eye_landmarks[:6]
+            # All three distances for every eye in one vectorized pass
+            d = eyes[:, [1, 2, 0]] - eyes[:, [5, 4, 3]]
+            lens = np.sqrt((d * d).sum(axis=-1))
             
-            # Calculate vertical distances using standard EAR formula
-            # Points order: [outer_corner(0), top_left(1), top_right(2), inner_corner(3), bottom_inner(4), bottom_outer(5)]
-            # Vertical distance 1: top-left to bottom-left (point 1 to point 5)
-            A = dist.euclidean(eye_points[1], eye_points[5])
-            # Vertical distance 2: top-right to bottom-right (point 2 to point 4)
-            B = dist.euclidean(eye_points[2], eye_points[4])
-            
-            # Horizontal distance: outer corner to inner corner (point 0 to point 3)
-            C = dist.euclidean(eye_points[0], eye_points[3])
-            
-            # Avoid division by zero
-            if C == 0:
-                return 1.0
-            
-            # Calculate EAR
-            ear = (A + B) / (2.0 * C)
+            # Avoid division by zero: degenerate eyes report "open"
+            horizontal = lens[:, 2]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ears = np.where(horizontal > 0, (lens[:, 0] + lens[:, 1]) / (2.0 * horizontal), 1.0)
             
             # Log for debugging if EAR is suspicious
-            if ear < 0.15:  # Very closed eye
-                logger.debug(f"Very low EAR detected: {ear:.3f}")
+            if logger.isEnabledFor(logging.DEBUG) and (ears < 0.15).any():  # Very closed eye
+                logger.debug(f"Very low EAR detected: {ears.min():.3f}")
             
-            return ear
+            return ears
         
         except Exception as e:
             logger.warning(f"EAR calculation failed: {e}")
-            return 1.0  # Default to eyes open
+            return np.ones(len(eyes))  # Default to eyes open
     
     def extract_eye_landmarks(
         self,
@@ -135,39 +184,42 @@ class BlinkDetector:
             Tuple of (left_eye_landmarks, right_eye_landmarks) as numpy arrays
             Each array contains 6 points in pixel coordinates
         """
-        if not landmarks:
+        eyes = self._eye_points(landmarks, image_width, image_height)
+        if eyes is None:
             return None, None
+        return eyes[0], eyes[1]
+    
+    def _eye_points(
+        self,
+        landmarks,
+        image_width: int,
+        image_height: int,
+        out: Optional[np.ndarray] = None
+    ) -> Optional[np.ndarray]:
+        """
+        Gather both eyes' landmarks as one (2, 6, 2) array in pixel coordinates
+        ([left, right] x 6 points x (x, y)), or None if unavailable.
+        Written into out (a contiguous (2, 6, 2) float64 array) when given.
+        """
+        if not landmarks:
+            return None
         
         try:
-            # MediaPipe landmarks are normalized (0-1), convert to pixel coordinates
-            left_eye_points = []
-            right_eye_points = []
-            
-            for idx in self.LEFT_EYE_INDICES:
-                if idx < len(landmarks.landmark):
-                    landmark = landmarks.landmark[idx]
-                    # Convert normalized to pixel coordinates
-                    x = landmark.x * image_width
-                    y = landmark.y * image_height
-                    left_eye_points.append([x, y])
-            
-            for idx in self.RIGHT_EYE_INDICES:
-                if idx < len(landmarks.landmark):
-                    landmark = landmarks.landmark[idx]
-                    # Convert normalized to pixel coordinates
-                    x = landmark.x * image_width
-                    y = landmark.y * image_height
-                    right_eye_points.append([x, y])
+            lm = landmarks.landmark
+            if len(lm) <= self._MAX_EYE_INDEX:
+                logger.warning(f"Incomplete eye landmarks: {len(lm)} points")
+                return None
             
-            if len(left_eye_points) == 6 and len(right_eye_points) == 6:
-                return np.array(left_eye_points), np.array(right_eye_points)
-            else:
-                logger.warning(f"Incomplete eye landmarks: left={len(left_eye_points)}, right={len(right_eye_points)}")
-                return None, None
+            # Gather only the 12 eye points (one protobuf read each), then scale
+            # normalized (0-1) coordinates to pixels in a single vectorized multiply
+            pts = out if out is not None else np.empty((2, 6, 2))
+            pts.reshape(12, 2)[:] = [(lm[i].x, lm[i].y) for i in self._EYE_INDICES]
+            pts *= (image_width, image_height)
+            return pts
         
         except Exception as e:
             logger.warning(f"Eye landmark extraction failed: {e}")
-            return None, None
+            return None
     
     def detect_blink_frame(
         self,
@@ -194,63 +246,104 @@ class BlinkDetector:
             logger.warning("Empty image provided to detect_blink_frame")
             return counter, total, 1.0, False
         
-        try:
-            # Convert BGR to RGB (MediaPipe expects RGB)
-            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            
+        ears = self.measure_ears(image)
+        if ears is None:
+            return counter, total, 1.0, False
+        left_ear, right_ear = ears
+        threshold = self.ear_threshold
+        consecutive_frames = self.consecutive_frames
+        
+        # Use average EAR for detection (more stable than minimum)
+        # But also check if either eye is blinking (more sensitive)
+        avg_ear = (left_ear + right_ear) / 2.0
+        min_ear = min(left_ear, right_ear)
+        
+        # Detect blink: either average is below threshold OR minimum is significantly below
+        # This catches both synchronized and unsynchronized blinks
+        is_blinking = avg_ear < threshold or min_ear < (threshold * 0.8)
+        
+        # Debug logging for blink detection (only log when blinking or close to threshold;
+        # gated so the f-string formatting is skipped entirely when DEBUG is off)
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug and (is_blinking or avg_ear < 0.3):
+            logger.debug(f"EAR - Left: {left_ear:.3f}, Right: {right_ear:.3f}, Avg: {avg_ear:.3f}, Min: {min_ear:.3f}, Threshold: {threshold}, Blinking: {is_blinking}")
+        
+        if is_blinking:
+            counter += 1
+            if debug:
+                logger.debug(f"Eyes closed - Counter: {counter}/{consecutive_frames}, Avg EAR: {avg_ear:.3f}, Min EAR: {min_ear:.3f}")
+        else:
+            # If eyes were closed for sufficient frames, count as blink
+            if counter >= consecutive_frames:
+                total += 1
+                logger.info(f"✅ Blink detected! Total: {total}, Avg EAR during blink: {avg_ear:.3f}, Counter was: {counter}")
+            # Reset counter
+            counter = 0
+        
+        return counter, total, avg_ear, is_blinking  # Return avg_ear for display
+    
+    def measure_ears(self, image: np.ndarray) -> Optional[Tuple[float, float]]:
+        """
+        Run FaceMesh on a frame and measure both eyes' EAR.
+        
+        Args:
+            image: Input image (BGR format)
+        
+        Returns:
+            Tuple of (left_ear, right_ear), or None if no face/eyes were found
+        """
+        # Landmarks are consumed right here, so the per-detector scratch buffer is safe to reuse
+        eyes = self.measure_eye_points(image, out=self._eye_buf)
+        if eyes is None:
+            return None
+        
+        # Calculate EAR for both eyes in one vectorized call
+        left_ear, right_ear = self.eye_aspect_ratios(eyes)
+        return float(left_ear), float(right_ear)
+    
+    def measure_eye_points(self, image: np.ndarray, out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """
+        Run FaceMesh on a frame and return both eyes' landmarks.
+        
+        Args:
+            image: Input image (BGR format)
+            out: Optional contiguous (2, 6, 2) float64 array to write the points into
+        
+        Returns:
+            (2, 6, 2) array of [left, right] eye points in pixels, or None if no face/eyes were found
+        """
+        h, w = image.shape[:2]
+        
+        # FaceMesh cost scales with input pixels; landmarks come back normalized (0-1),
+        # so shrinking the frame first does not change the EAR geometry
+        if self.max_input_dim and max(h, w) > self.max_input_dim:
+            scale = self.max_input_dim / max(h, w)
+            image = cv2.resize(image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
             h, w = image.shape[:2]
-            
-            # Process with MediaPipe FaceMesh
-            results = self.face_mesh.process(rgb_image)
-            
-            if not results.multi_face_landmarks:
-                # No face detected
-                logger.debug("No face detected in frame")
-                return counter, total, 1.0, False
-            
-            # Get first face (we only detect one)
-            face_landmarks = results.multi_face_landmarks[0]
-            
-            # Extract eye landmarks
-            left_eye, right_eye = self.extract_eye_landmarks(face_landmarks, w, h)
-            
-            if left_eye is None or right_eye is None:
-                logger.debug("Could not extract eye landmarks")
-                return counter, total, 1.0, False
-            
-            # Calculate EAR for both eyes
-            left_ear = self.eye_aspect_ratio(left_eye)
-            right_ear = self.eye_aspect_ratio(right_eye)
-            
-            # Use average EAR for detection (more stable than minimum)
-            # But also check if either eye is blinking (more sensitive)
-            avg_ear = (left_ear + right_ear) / 2.0
-            min_ear = min(left_ear, right_ear)
-            
-            # Detect blink: either average is below threshold OR minimum is significantly below
-            # This catches both synchronized and unsynchronized blinks
-            is_blinking = avg_ear < self.ear_threshold or min_ear < (self.ear_threshold * 0.8)
-            
-            # Debug logging for blink detection (only log when blinking or close to threshold)
-            if is_blinking or avg_ear < 0.3:
-                logger.debug(f"EAR - Left: {left_ear:.3f}, Right: {right_ear:.3f}, Avg: {avg_ear:.3f}, Min: {min_ear:.3f}, Threshold: {self.ear_threshold}, Blinking: {is_blinking}")
-            
-            if is_blinking:
-                counter += 1
-                logger.debug(f"Eyes closed - Counter: {counter}/{self.consecutive_frames}, Avg EAR: {avg_ear:.3f}, Min EAR: {min_ear:.3f}")
-            else:
-                # If eyes were closed for sufficient frames, count as blink
-                if counter >= self.consecutive_frames:
-                    total += 1
-                    logger.info(f"✅ Blink detected! Total: {total}, Avg EAR during blink: {avg_ear:.3f}, Counter was: {counter}")
-                # Reset counter
-                counter = 0
-            
-            return counter, total, avg_ear, is_blinking  # Return avg_ear for display
         
-        except Exception as e:
-            logger.error(f"Blink detection failed: {e}", exc_info=True)
-            return counter, total, 1.0, False
+        # Convert BGR to RGB (MediaPipe expects RGB) into a reused buffer.
+        # Safe because each thread has its own detector and FaceMesh copies its input.
+        if self._rgb_buf is None or self._rgb_buf.shape != image.shape:
+            self._rgb_buf = np.empty_like(image)
+        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=self._rgb_buf)
+        
+        # Process with MediaPipe FaceMesh
+        results = self.face_mesh.process(rgb_image)
+        
+        if not results.multi_face_landmarks:
+            # No face detected
+            logger.debug("No face detected in frame")
+            return None
+        
+        # Get first face (we only detect one)
+        face_landmarks = results.multi_face_landmarks[0]
+        
+        # Extract eye landmarks
+        eyes = self._eye_points(face_landmarks, w, h, out=out)
+        
+        if eyes is None:
+            logger.debug("Could not extract eye landmarks")
+        return eyes
     
     def detect_blinks_batch(
         self,
@@ -260,6 +353,9 @@ class BlinkDetector:
     ) -> Dict[str, any]:
         """
         Detect blinks across a batch of frames.
+        FaceMesh runs per frame to collect eye landmarks; EARs for all frames are
+        then computed in one vectorized call and the blink state machine runs
+        once over the whole EAR sequence.
         
         Args:
             frames: List of image frames (BGR format)
@@ -271,38 +367,53 @@ class BlinkDetector:
             - total_blinks: Total number of blinks detected
             - blink_frames: List of frame indices where blinks were detected
             - ear_values: List of EAR values per frame
+            - is_blinking: Per-frame flag, True where the eyes were closed
             - face_detected_ratio: Ratio of frames where face was detected
         """
-        counter = initial_counter
-        total = initial_total
-        blink_frames = []
-        ear_values = []
-        frames_with_face = 0
+        n = len(frames)
+        eye_points = np.zeros((n, 2, 6, 2))
+        has_face = np.zeros(n, dtype=np.bool_)
         
+        # 1. Per-frame landmark extraction (MediaPipe)
         for i, frame in enumerate(frames):
-            counter, total, ear, is_blinking = self.detect_blink_frame(frame, counter, total)
-            
-            ear_values.append(ear)
-            
-            if ear < 1.0:  # Face detected (ear would be 1.0 if no face)
-                frames_with_face += 1
-            
-            # Check if this frame completed a blink
-            if counter == 0 and total > initial_total:
-                blink_frames.append(i)
+            if frame is None or frame.size == 0:
+                continue
+            try:
+                # Written straight into the batch array - no per-frame landmark allocation
+                eyes = self.measure_eye_points(frame, out=eye_points[i])
+            except Exception as e:
+                logger.error(f"Blink detection failed: {e}", exc_info=True)
+                continue
+            has_face[i] = eyes is not None
+        
+        # 2. EAR for every eye of every frame in one call (frames without a face stay at 1.0)
+        ears = np.ones((n, 2))
+        if has_face.any():
+            ears[has_face] = self.eye_aspect_ratios(eye_points[has_face].reshape(-1, 6, 2)).reshape(-1, 2)
+        left_ears, right_ears = ears[:, 0], ears[:, 1]
+        
+        # 3. Blink state machine over the EAR sequence (same rule as detect_blink_frame)
+        avg_ears = (left_ears + right_ears) / 2.0
+        closed = has_face & (
+            (avg_ears < self.ear_threshold) | (np.minimum(left_ears, right_ears) < self.ear_threshold * 0.8)
+        )
+        blink_frames, counter, total = _run_blink_fsm(
+            closed, has_face, self.consecutive_frames, initial_counter, initial_total
+        )
         
-        face_detection_ratio = frames_with_face / len(frames) if len(frames) > 0 else 0.0
+        face_detection_ratio = float(has_face.sum()) / n if n > 0 else 0.0
         
         result = {
             "total_blinks": total - initial_total,  # New blinks detected
-            "blink_frames": blink_frames,
-            "ear_values": ear_values,
+            "blink_frames": blink_frames.tolist(),
+            "ear_values": avg_ears.tolist(),
+            "is_blinking": closed.tolist(),
             "face_detection_ratio": face_detection_ratio,
             "final_counter": counter,
             "final_total": total
         }
         
-        logger.info(f"Batch blink detection: {total - initial_total} blinks in {len(frames)} frames")
+        logger.info(f"Batch blink detection: {total - initial_total} blinks in {n} frames")
         return result
     
     def cleanup(self):
@@ -313,25 +424,26 @@ class BlinkDetector:
 
 
 # ============================================================================
-# Singleton Pattern - Thread-safe
+# Per-thread instances
 # ============================================================================
+# FaceMesh graphs are not safe to share between threads and (with
+# static_image_mode=False) carry tracking state, so each worker thread gets
+# its own BlinkDetector instead of one process-wide singleton.
 
-_detector_instance: Optional[BlinkDetector] = None
-_detector_lock = threading.Lock()
+_thread_local = threading.local()
 
 
 def get_blink_detector() -> BlinkDetector:
     """
-    Get or create singleton BlinkDetector instance.
-    Thread-safe.
+    Get or create the calling thread's BlinkDetector instance.
+    Thread-safe: instances are never shared across threads.
     """
-    global _detector_instance
+    detector = getattr(_thread_local, "detector", None)
     
-    if _detector_instance is None:
-        with _detector_lock:
-            if _detector_instance is None:
-                _detector_instance = BlinkDetector()
-                logger.info("BlinkDetector singleton created")
+    if detector is None:
+        detector = BlinkDetector()
+        _thread_local.detector = detector
+        logger.info(f"BlinkDetector created for thread {threading.current_thread().name}")
     
-    return _detector_instance
+    return detector
 
@@ -7,8 +7,9 @@ FIXED: Separate log file, improved error messages
 
 import cv2
 import numpy as np
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Optional, Tuple, List
 import threading
 
 from configs.config import config
@@ -17,6 +18,24 @@ from utils.logger import get_logger
 # ✅ FIX: Use separate log file for face detection
 logger = get_logger(__name__, log_file="face_detector.log")
 
+# OpenCV DNN (backend_id, target_id) for each configurable inference backend
+_DNN_BACKENDS = {
+    "default": (cv2.dnn.DNN_BACKEND_DEFAULT, cv2.dnn.DNN_TARGET_CPU),
+    "openvino": (cv2.dnn.DNN_BACKEND_INFERENCE_ENGINE, cv2.dnn.DNN_TARGET_CPU),
+    "cuda": (cv2.dnn.DNN_BACKEND_CUDA, cv2.dnn.DNN_TARGET_CUDA),
+    "cuda_fp16": (cv2.dnn.DNN_BACKEND_CUDA, cv2.dnn.DNN_TARGET_CUDA_FP16),
+}
+
+# ArcFace/InsightFace reference positions of the 5 landmarks in a 112x112 chip,
+# in YuNet's landmark order (right eye, left eye, nose, right mouth, left mouth)
+ARCFACE_REF_LANDMARKS = np.array([
+    [38.2946, 51.6963],
+    [73.5318, 51.5014],
+    [56.0252, 71.7366],
+    [41.5493, 92.3655],
+    [70.7299, 92.2041],
+], dtype=np.float32)
+
 
 class FaceDetectionResult:
     """Encapsulates face detection result"""
@@ -55,7 +74,10 @@ class YuNetFaceDetector:
         self,
         model_path: Optional[str] = None,
         conf_threshold: float = 0.4,
-        nms_threshold: float = 0.3
+        nms_threshold: float = 0.3,
+        pool_size: int = 8,
+        backend: str = "default",
+        align_faces: bool = True
     ):
         """
         Initialize YuNet detector.
@@ -64,6 +86,9 @@ class YuNetFaceDetector:
             model_path: Path to yunet.onnx. If None, uses config.
             conf_threshold: Confidence threshold (0.0-1.0). Lower = more lenient (default: 0.4)
             nms_threshold: Non-maximum suppression threshold
+            pool_size: Max detectors kept warm, one per input size bucket (LRU evicted)
+            backend: OpenCV DNN backend - "default" (CPU), "openvino", "cuda" or "cuda_fp16"
+            align_faces: Landmark-align extracted face chips (ArcFace layout) instead of bbox crops
         """
         if model_path is None:
             models_dir = Path(config.get("paths", "models_dir", default="models"))
@@ -81,43 +106,62 @@ class YuNetFaceDetector:
         self.model_path = model_path
         self.conf_threshold = conf_threshold
         self.nms_threshold = nms_threshold
-        self.detector = None
-        self._last_size = (0, 0)
+        self.align_faces = align_faces
+        if backend not in _DNN_BACKENDS:
+            logger.warning(f"Unknown YuNet backend '{backend}', using default CPU backend")
+            backend = "default"
+        self.backend = backend
+        self.backend_id, self.target_id = _DNN_BACKENDS[backend]
+        self.pool_size = max(1, pool_size)
+        # Detectors keyed by bucketed input size, least recently used first
+        self._pool: "OrderedDict[Tuple[int, int], cv2.FaceDetectorYN]" = OrderedDict()
         self._lock = threading.Lock()  # Thread lock for detector access
 
-        logger.info(f"YuNet initialized: {Path(model_path).name} (conf={conf_threshold}, nms={nms_threshold})")
+        logger.info(f"YuNet initialized: {Path(model_path).name} (conf={conf_threshold}, nms={nms_threshold}, backend={backend})")
+
+    # Input sizes are rounded up to this multiple so nearby resolutions share a detector
+    SIZE_BUCKET = 32
 
-    def _ensure_detector(self, width: int, height: int) -> None:
+    @classmethod
+    def _bucket_size(cls, width: int, height: int) -> Tuple[int, int]:
+        """Round (width, height) up to the next SIZE_BUCKET multiple."""
+        b = cls.SIZE_BUCKET
+        return -(-width // b) * b, -(-height // b) * b
+
+    def _ensure_detector(self, width: int, height: int) -> "cv2.FaceDetectorYN":
         """
-        Initialize or resize detector for image size.
-        Thread-safe implementation for concurrent requests with different image dimensions.
-        Uses setInputSize() to dynamically adjust detector without recreation.
+        Get a detector whose input size is (width, height), creating it if needed.
+        Each size keeps its own warmed detector, so alternating between ID photo,
+        selfie and mobile upload resolutions doesn't re-shape a single network on
+        every request. Must be called with self._lock held.
         """
-        if self.detector is None:
-            # First-time initialization with default size
-            try:
-                self.detector = cv2.FaceDetectorYN.create(
-                    model=self.model_path,
-                    config="",
-                    input_size=(640, 640),  # Default size, will be adjusted per image
-                    score_threshold=self.conf_threshold,
-                    nms_threshold=self.nms_threshold,
-                    top_k=5000
-                )
-                logger.info(f"YuNet detector created (supports dynamic resizing)")
-            except Exception as e:
-                logger.error(f"Failed to initialize detector: {e}")
-                raise
-        
-        # Always set input size for current image (thread-safe, no recreation needed)
-        if self._last_size != (width, height):
-            try:
-                self.detector.setInputSize((width, height))
-                self._last_size = (width, height)
-                logger.debug(f"Detector resized to: {width}x{height}")
-            except Exception as e:
-                logger.error(f"Failed to resize detector: {e}")
-                raise
+        size = (width, height)
+        detector = self._pool.get(size)
+        if detector is not None:
+            self._pool.move_to_end(size)
+            return detector
+
+        try:
+            detector = cv2.FaceDetectorYN.create(
+                model=self.model_path,
+                config="",
+                input_size=size,
+                score_threshold=self.conf_threshold,
+                nms_threshold=self.nms_threshold,
+                top_k=5000,
+                backend_id=self.backend_id,
+                target_id=self.target_id
+            )
+        except Exception as e:
+            logger.error(f"Failed to initialize detector: {e}")
+            raise
+
+        self._pool[size] = detector
+        if len(self._pool) > self.pool_size:
+            evicted, _ = self._pool.popitem(last=False)
+            logger.debug(f"Evicted detector for {evicted[0]}x{evicted[1]}")
+        logger.info(f"YuNet detector created for {width}x{height} ({len(self._pool)}/{self.pool_size} pooled)")
+        return detector
 
     def detect(
         self,
@@ -154,44 +198,38 @@ class YuNetFaceDetector:
             logger.info(f"Downscaled image for detection: {w}x{h} → {new_w}x{new_h} (scale={scale:.3f})")
             w, h = new_w, new_h
 
+        # Pad bottom/right up to the size bucket; detections keep their coordinates
+        bucket_w, bucket_h = self._bucket_size(w, h)
+        if (bucket_w, bucket_h) != (w, h):
+            detect_image = cv2.copyMakeBorder(
+                detect_image, 0, bucket_h - h, 0, bucket_w - w, cv2.BORDER_CONSTANT, value=0
+            )
+
         # Use lock to ensure thread-safe access to detector (prevents OpenCV race conditions)
         with self._lock:
-            self._ensure_detector(w, h)
+            detector = self._ensure_detector(bucket_w, bucket_h)
 
             try:
                 # Detect faces
-                _, faces = self.detector.detect(detect_image)
+                _, faces = detector.detect(detect_image)
 
                 if faces is None or len(faces) == 0:
                     logger.debug(f"No faces detected (threshold={self.conf_threshold})")
                     return None
 
                 # Parse detections - YuNet format: [x, y, w, h, 5 landmarks (x,y pairs), confidence]
+                # Whole-array parse; a FaceDetectionResult is only built for the face returned.
                 # If image was downscaled for detection, scale coordinates back to original size
-                detections = []
-                for face in faces:
-                    bbox = face[:4].copy()
-                    landmarks = face[4:14].reshape(5, 2).copy()
-                    confidence = float(face[14])
-
-                    if scale != 1.0:
-                        bbox = (bbox / scale).astype(np.int32)
-                        landmarks = (landmarks / scale).astype(np.int32)
-                    else:
-                        bbox = bbox.astype(np.int32)
-                        landmarks = landmarks.astype(np.int32)
-
-                    detections.append(FaceDetectionResult(
-                        bbox=bbox,
-                        confidence=confidence,
-                        landmarks=landmarks
-                    ))
-                
+                coords = faces[:, :14] / scale if scale != 1.0 else faces[:, :14]
+                coords = coords.astype(np.int32)
+                boxes = coords[:, :4]
+                confidences = faces[:, 14]
+                areas = boxes[:, 2] * boxes[:, 3]
+
                 # Log all detections for debugging (always log to understand what's being detected)
-                logger.info(f"YuNet detected {len(detections)} face(s):")
-                for i, det in enumerate(detections):
-                    face_area = det.bbox[2] * det.bbox[3]
-                    logger.info(f"  Face {i+1}: size={det.bbox[2]}x{det.bbox[3]}, area={face_area}, conf={det.confidence:.3f}, pos=[{det.bbox[0]},{det.bbox[1]}]")
+                logger.info(f"YuNet detected {len(faces)} face(s):")
+                for i, (bx, by, bw, bh) in enumerate(boxes.tolist()):
+                    logger.info(f"  Face {i+1}: size={bw}x{bh}, area={bw * bh}, conf={confidences[i]:.3f}, pos=[{bx},{by}]")
 
                 if return_largest:
                     # Apply multiple filters to eliminate false positives:
@@ -203,57 +241,60 @@ class YuNetFaceDetector:
                     min_aspect_ratio = 0.5
                     max_aspect_ratio = 2.0
                     
-                    valid_detections = []
-                    for det in detections:
-                        width, height = det.bbox[2], det.bbox[3]
-                        aspect_ratio = width / height if height > 0 else 0
-                        
-                        # Check all criteria
-                        size_ok = width >= min_face_size and height >= min_face_size
-                        conf_ok = det.confidence >= min_confidence
-                        aspect_ok = min_aspect_ratio <= aspect_ratio <= max_aspect_ratio
-                        
-                        if size_ok and conf_ok and aspect_ok:
-                            valid_detections.append(det)
-                        else:
-                            # Log why this detection was filtered out
-                            reasons = []
-                            if not size_ok:
-                                reasons.append(f"size={width}x{height}<{min_face_size}")
-                            if not conf_ok:
-                                reasons.append(f"conf={det.confidence:.3f}<{min_confidence}")
-                            if not aspect_ok:
-                                reasons.append(f"aspect={aspect_ratio:.2f} out of range")
-                            logger.debug(f"Filtered out detection: {', '.join(reasons)}")
+                    widths, heights = boxes[:, 2], boxes[:, 3]
+                    with np.errstate(divide="ignore", invalid="ignore"):
+                        aspect_ratios = np.where(heights > 0, widths / heights, 0.0)
+                    
+                    # Check all criteria
+                    size_ok = (widths >= min_face_size) & (heights >= min_face_size)
+                    conf_ok = confidences >= min_confidence
+                    aspect_ok = (aspect_ratios >= min_aspect_ratio) & (aspect_ratios <= max_aspect_ratio)
+                    valid = size_ok & conf_ok & aspect_ok
+                    
+                    # Log why each detection was filtered out
+                    for i in np.flatnonzero(~valid):
+                        reasons = []
+                        if not size_ok[i]:
+                            reasons.append(f"size={widths[i]}x{heights[i]}<{min_face_size}")
+                        if not conf_ok[i]:
+                            reasons.append(f"conf={confidences[i]:.3f}<{min_confidence}")
+                        if not aspect_ok[i]:
+                            reasons.append(f"aspect={aspect_ratios[i]:.2f} out of range")
+                        logger.debug(f"Filtered out detection: {', '.join(reasons)}")
                     
-                    if not valid_detections:
+                    n_valid = int(valid.sum())
+                    if n_valid == 0:
                         # All detected faces failed quality filters (likely false positives)
-                        if detections:
-                            logger.warning(
-                                f"Detected {len(detections)} face(s) but all failed quality filters. "
-                                f"This usually means: (1) Face is too small/far from camera, "
-                                f"(2) Poor image quality/blur, (3) False detections (logos, patterns). "
-                                f"Required: size≥{min_face_size}x{min_face_size}, confidence≥{min_confidence:.2f}, aspect ratio {min_aspect_ratio}-{max_aspect_ratio}"
-                            )
-                        else:
-                            logger.debug(f"No faces detected (threshold={self.conf_threshold})")
+                        logger.warning(
+                            f"Detected {len(faces)} face(s) but all failed quality filters. "
+                            f"This usually means: (1) Face is too small/far from camera, "
+                            f"(2) Poor image quality/blur, (3) False detections (logos, patterns). "
+                            f"Required: size≥{min_face_size}x{min_face_size}, confidence≥{min_confidence:.2f}, aspect ratio {min_aspect_ratio}-{max_aspect_ratio}"
+                        )
                         return None
                     
                     # Select largest valid face
-                    largest = max(valid_detections, key=lambda x: x.bbox[2] * x.bbox[3])
-                    
-                    logger.info(f"Face detected: conf={largest.confidence:.3f}, bbox={largest.bbox.tolist()}, size={largest.bbox[2]}x{largest.bbox[3]}")
+                    best = int(np.argmax(np.where(valid, areas, -1)))
+                else:
+                    # Highest confidence face
+                    best = int(np.argmax(confidences))
+                    n_valid = len(faces)
+
+                result = FaceDetectionResult(
+                    bbox=boxes[best].copy(),
+                    confidence=float(confidences[best]),
+                    landmarks=coords[best, 4:14].reshape(5, 2).copy()
+                )
+
+                if return_largest:
+                    logger.info(f"Face detected: conf={result.confidence:.3f}, bbox={result.bbox.tolist()}, size={result.bbox[2]}x{result.bbox[3]}")
                     
                     # Log if we filtered out smaller detections
-                    if len(valid_detections) < len(detections):
-                        filtered_count = len(detections) - len(valid_detections)
+                    if n_valid < len(faces):
+                        filtered_count = len(faces) - n_valid
                         logger.info(f"Filtered out {filtered_count} tiny false positive(s)")
-                    
-                    return largest
                 
-                # Sort by confidence
-                detections.sort(key=lambda x: x.confidence, reverse=True)
-                return detections[0] if detections else None
+                return result
                 
             except Exception as e:
                 logger.error(f"Face detection failed: {e}")
@@ -291,15 +332,46 @@ class YuNetFaceDetector:
         x2 = min(img_w, x + w + pad_w)
         y2 = min(img_h, y + h + pad_h)
 
-        # Crop
+        # Crop - a strided view into image, no pixel copy; cv2.resize reads it in place
         face_crop = image[y1:y2, x1:x2]
 
-        # Resize to target size for embedding extraction
+        # Resize to target size for embedding extraction (the only pass over the pixels;
+        # INTER_AREA averages large faces down, which warpAffine cannot do)
         if target_size is not None and face_crop.size > 0:
             face_crop = cv2.resize(face_crop, target_size, interpolation=cv2.INTER_AREA)
 
         return face_crop
 
+    def align_face(
+        self,
+        image: np.ndarray,
+        landmarks: np.ndarray,
+        target_size: Tuple[int, int] = (112, 112)
+    ) -> Optional[np.ndarray]:
+        """
+        Warp face to the ArcFace chip layout using its 5 landmarks.
+        One similarity transform + warpAffine, no intermediate crop.
+
+        Args:
+            image: Source image
+            landmarks: 5 landmark points [[x, y], ...] in image coordinates
+            target_size: Output size (width, height)
+
+        Returns:
+            Aligned face chip, or None if no transform could be estimated
+        """
+        ref = ARCFACE_REF_LANDMARKS
+        if target_size != (112, 112):
+            ref = ref * (np.array(target_size, dtype=np.float32) / 112.0)
+
+        M, _ = cv2.estimateAffinePartial2D(
+            np.asarray(landmarks, dtype=np.float32).reshape(5, 2), ref, method=cv2.LMEDS
+        )
+        if M is None:
+            return None
+
+        return cv2.warpAffine(image, M, target_size, flags=cv2.INTER_LINEAR, borderValue=0)
+
     def detect_and_extract(
         self,
         image: np.ndarray,
@@ -311,7 +383,7 @@ class YuNetFaceDetector:
 
         Args:
             image: Input image
-            padding: Padding around detected face
+            padding: Padding around detected face (bbox crops only)
             target_size: Resize extracted face to this size
 
         Returns:
@@ -322,6 +394,13 @@ class YuNetFaceDetector:
         if result is None:
             return None
 
+        # Landmark-aligned chip (what the ArcFace embedder is trained on)
+        if self.align_faces and target_size is not None:
+            result.face_crop = self.align_face(image, result.landmarks, target_size=target_size)
+            if result.face_crop is not None:
+                return result
+            logger.warning("Face alignment failed, falling back to bbox crop")
+
         # Extract face crop
         result.face_crop = self.extract_face(
             image,
@@ -332,6 +411,27 @@ class YuNetFaceDetector:
 
         return result
 
+    def detect_and_extract_batch(
+        self,
+        images: List[np.ndarray],
+        padding: float = 0.2,
+        target_size: Tuple[int, int] = (112, 112)
+    ) -> List[Optional[FaceDetectionResult]]:
+        """
+        Detect and crop the largest face in each image.
+        FaceDetectorYN takes one image per call, so detection runs sequentially;
+        callers get all crops back from one worker hop and can batch the embeddings.
+
+        Args:
+            images: Input images
+            padding: Padding around detected face
+            target_size: Resize extracted face to this size
+
+        Returns:
+            List of FaceDetectionResult (or None) aligned with images
+        """
+        return [self.detect_and_extract(img, padding=padding, target_size=target_size) for img in images]
+
 
 # ============================================================================
 # Singleton Pattern - Thread-safe
@@ -352,7 +452,10 @@ def get_face_detector() -> YuNetFaceDetector:
             if _detector_instance is None:
                 _detector_instance = YuNetFaceDetector(
                     conf_threshold=config.get("models", "face_detection", "conf_threshold", default=0.4),
-                    nms_threshold=config.get("models", "face_detection", "nms_threshold", default=0.3)
+                    nms_threshold=config.get("models", "face_detection", "nms_threshold", default=0.3),
+                    pool_size=config.get("models", "face_detection", "pool_size", default=8),
+                    backend=config.get("models", "face_detection", "backend", default="default"),
+                    align_faces=config.get("models", "face_detection", "align_faces", default=True)
                 )
                 logger.info("Face detector singleton created")
     return _detector_instance
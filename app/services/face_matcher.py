@@ -6,22 +6,63 @@ FIXED: Direct embedding extraction without re-detection + shape fix
 """
 
 import numpy as np
-from typing import Optional, Dict, Any
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
 import cv2
+import hashlib
+import math
+import os
 import threading
 
 import insightface
+import onnxruntime as ort
 from insightface.app import FaceAnalysis
 
 from configs.config import config
 from utils.logger import get_logger
 
+try:
+    from numba import njit, prange
+except ImportError:  # Optional dependency - verify_batch then always uses BLAS
+    njit = None
+
+try:
+    import cupy
+except ImportError:  # Optional dependency - large verify_batch matrices on GPU
+    cupy = None
+
 logger = get_logger(__name__, log_file="face_matcher.log")
 
+# Embeddings with a smaller L2 norm are treated as failed extractions
+_MIN_EMBEDDING_NORM = 1e-12
+
+# verify_batch uses the JIT kernel below this many pairs (BLAS call overhead dominates)
+_SMALL_BATCH_PAIRS = 4096
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _cosine_matrix(a, b):
+        """(N, D) x (M, D) unit vectors -> (N, M) float32 cosine similarities."""
+        out = np.empty((a.shape[0], b.shape[0]), dtype=np.float32)
+        for i in prange(a.shape[0]):
+            for j in range(b.shape[0]):
+                acc = np.float32(0.0)
+                for k in range(a.shape[1]):
+                    acc += a[i, k] * b[j, k]
+                out[i, j] = acc
+        return out
+else:
+    _cosine_matrix = None
+
 
 class FaceMatchResult:
     """Encapsulates face matching result"""
     
+    __slots__ = (
+        "verified", "confidence", "cosine_similarity",
+        "euclidean_distance", "threshold_used", "message"
+    )
+    
     def __init__(
         self,
         verified: bool,
@@ -62,7 +103,10 @@ class InsightFaceMatcher:
         self,
         model_name: Optional[str] = None,
         use_gpu: bool = False,
-        similarity_threshold: float = 0.4
+        similarity_threshold: float = 0.4,
+        intra_op_threads: Optional[int] = None,
+        embedding_cache_size: int = 256,
+        rec_model_path: Optional[str] = None
     ):
         """
         Initialize InsightFace matcher.
@@ -71,6 +115,10 @@ class InsightFaceMatcher:
             model_name: Model pack ('buffalo_l', 'buffalo_s'). If None, uses config.
             use_gpu: Use CUDA if available. Set to False for CPU-only.
             similarity_threshold: Cosine similarity threshold for verification.
+            intra_op_threads: ONNX Runtime intra-op threads per session (None = ORT default).
+            embedding_cache_size: Embeddings memoized by face-crop content (0 = off).
+            rec_model_path: Recognition ONNX to use instead of the pack's own, e.g. an
+                            FP16 conversion with float32 inputs/outputs (keep_io_types=True).
         """
         if model_name is None:
             model_name = config.get("models", "face_recognition", "model_name", default="buffalo_l")
@@ -80,13 +128,27 @@ class InsightFaceMatcher:
 
         self.model_name = model_name
         self.similarity_threshold = similarity_threshold
+        # Large N x M similarity matrices go to the GPU (small ones aren't worth the PCIe copies)
+        self._gpu_matmul = use_gpu and cupy is not None
+        # Per-thread resize buffer and input blob (the matcher is a shared singleton)
+        self._scratch = threading.local()
+        # LRU of content hash -> embedding, so re-scored crops (retries, galleries) skip inference
+        self._cache_size = embedding_cache_size
+        self._cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._cache_lock = threading.Lock()
 
         # Initialize FaceAnalysis
         providers = ['CUDAExecutionProvider', 'CPUExecutionProvider'] if use_gpu else ['CPUExecutionProvider']
         
         try:
             logger.info(f"Initializing InsightFace with model: {model_name}")
-            self.app = FaceAnalysis(name=model_name, providers=providers)
+            # Pin intra-op threads so concurrent ML workers don't oversubscribe cores
+            session_kwargs = {}
+            if intra_op_threads:
+                sess_options = ort.SessionOptions()
+                sess_options.intra_op_num_threads = intra_op_threads
+                session_kwargs["sess_options"] = sess_options
+            self.app = FaceAnalysis(name=model_name, providers=providers, **session_kwargs)
             
             # Prepare with device
             try:
@@ -96,7 +158,8 @@ class InsightFaceMatcher:
             except Exception as gpu_error:
                 if use_gpu:
                     logger.warning(f"GPU failed, falling back to CPU: {gpu_error}")
-                    self.app.prepare(ctx_id=-1, det_size=(640, 640))
+                    ctx_id = -1
+                    self.app.prepare(ctx_id=ctx_id, det_size=(640, 640))
                 else:
                     raise
             
@@ -112,6 +175,16 @@ class InsightFaceMatcher:
             if self.rec_model is None:
                 raise RuntimeError("No recognition model found in InsightFace app")
             
+            # Optional replacement recognition model (e.g. FP16: half the weight/activation
+            # bandwidth, tensor-core speedups on GPU). Embeddings are still returned as float32.
+            if rec_model_path:
+                rec_model = insightface.model_zoo.get_model(rec_model_path, providers=providers, **session_kwargs)
+                if rec_model is None or not hasattr(rec_model, 'get_feat'):
+                    raise RuntimeError(f"Not a recognition model: {rec_model_path}")
+                rec_model.prepare(ctx_id=ctx_id)
+                self.rec_model = rec_model
+                logger.info(f"Recognition model overridden: {rec_model_path}")
+            
             device = "GPU" if use_gpu else "CPU"
             logger.info(f"InsightFace ready: {model_name} on {device}, threshold={similarity_threshold}")
             
@@ -119,6 +192,77 @@ class InsightFaceMatcher:
             logger.error(f"Failed to initialize InsightFace: {e}")
             raise
 
+    def _scratch_buffers(self):
+        """This thread's 112x112x3 uint8 resize buffer and (1, 3, 112, 112) float32 input blob."""
+        bufs = getattr(self._scratch, "bufs", None)
+        if bufs is None:
+            bufs = self._scratch.bufs = (
+                np.empty((112, 112, 3), dtype=np.uint8),
+                np.empty((1, 3, 112, 112), dtype=np.float32),
+            )
+        return bufs
+
+    def _prepare_face(self, face_image: np.ndarray, resize_buf: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Bring a BGR/grayscale face crop to 112x112 BGR.
+
+        Args:
+            face_image: Face crop (BGR or grayscale)
+            resize_buf: Optional 112x112x3 uint8 buffer to resize into (instead of allocating)
+        """
+        # Convert grayscale to BGR if needed
+        if len(face_image.shape) == 2:
+            face_image = cv2.cvtColor(face_image, cv2.COLOR_GRAY2BGR)
+
+        # Ensure 112x112 size (InsightFace standard)
+        if face_image.shape[:2] != (112, 112):
+            logger.debug(f"Resizing face from {face_image.shape[:2]} to (112, 112)")
+            if face_image.dtype != np.uint8:
+                resize_buf = None
+            face_image = cv2.resize(face_image, (112, 112), dst=resize_buf)
+
+        return face_image
+
+    def _fill_blob(self, face_bgr: np.ndarray, out: np.ndarray) -> None:
+        """
+        Write a 112x112 BGR face into out (3, 112, 112) as the model's normalized CHW input.
+        The HWC->CHW transpose is a strided view, so this is one subtract and one in-place scale.
+        
+        Channels stay in BGR order, matching the previous pipeline (BGR->RGB conversion
+        followed by get_feat's swapRB=True), which similarity_threshold and any persisted
+        face_db index were built on. Feeding RGB would change every embedding and needs a
+        re-tuned threshold plus an index rebuild, so it is left to a separate change.
+        """
+        np.subtract(face_bgr.transpose(2, 0, 1), self.rec_model.input_mean, out=out)
+        out *= 1.0 / self.rec_model.input_std
+
+    def _run_rec_model(self, blob: np.ndarray) -> np.ndarray:
+        """Run the recognition ONNX session on a prepared (N, 3, 112, 112) blob."""
+        rec = self.rec_model
+        return rec.session.run(rec.output_names, {rec.input_name: blob})[0]
+
+    @staticmethod
+    def _cache_key(face_image: np.ndarray) -> bytes:
+        """128-bit BLAKE2b digest of the crop's pixels, shape and dtype."""
+        h = hashlib.blake2b(np.ascontiguousarray(face_image), digest_size=16)
+        h.update(f"{face_image.shape}{face_image.dtype}".encode())
+        return h.digest()
+
+    def _cache_get(self, key: bytes) -> Optional[np.ndarray]:
+        with self._cache_lock:
+            embedding = self._cache.get(key)
+            if embedding is not None:
+                self._cache.move_to_end(key)
+            return embedding
+
+    def _cache_put(self, key: bytes, embedding: np.ndarray) -> None:
+        embedding.setflags(write=False)  # Shared between callers from now on
+        with self._cache_lock:
+            self._cache[key] = embedding
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
     def get_embedding(self, face_image: np.ndarray) -> Optional[np.ndarray]:
         """
         Extract normalized embedding from face image.
@@ -134,37 +278,96 @@ class InsightFaceMatcher:
             logger.warning("Empty face image provided")
             return None
 
-        # Convert grayscale to BGR if needed
-        if len(face_image.shape) == 2:
-            face_image = cv2.cvtColor(face_image, cv2.COLOR_GRAY2BGR)
-        
-        # Ensure 112x112 size (InsightFace standard)
-        if face_image.shape[:2] != (112, 112):
-            logger.debug(f"Resizing face from {face_image.shape[:2]} to (112, 112)")
-            face_image = cv2.resize(face_image, (112, 112))
+        key = None
+        if self._cache_size > 0:
+            key = self._cache_key(face_image)
+            cached = self._cache_get(key)
+            if cached is not None:
+                logger.debug("Embedding cache hit")
+                return cached
 
         try:
             # ✅ FIX: Direct embedding extraction (no detection)
-            # Convert BGR to RGB (InsightFace expects RGB)
-            face_rgb = cv2.cvtColor(face_image, cv2.COLOR_BGR2RGB)
+            # Per-thread buffers: the blob is consumed by session.run before this thread reuses it
+            resize_buf, blob = self._scratch_buffers()
+            self._fill_blob(self._prepare_face(face_image, resize_buf), blob[0])
             
             # Get embedding directly from recognition model
-            embedding = self.rec_model.get_feat(face_rgb)
+            embedding = self._run_rec_model(blob)
             
             # ✅ FIX: Flatten to 1D array if needed (1,512) -> (512,)
-            if embedding.ndim > 1:
-                embedding = embedding.flatten()
+            # Contiguous float32 so downstream dot products hit the BLAS sdot/sgemv paths
+            embedding = np.ascontiguousarray(embedding, dtype=np.float32).reshape(-1)
             
-            # Normalize (L2 norm)
-            embedding = embedding / np.linalg.norm(embedding)
+            # Normalize (L2 norm) in place; a zero vector carries no identity
+            norm = math.sqrt(float(np.vdot(embedding, embedding)))
+            if norm <= _MIN_EMBEDDING_NORM:
+                logger.warning("Degenerate (zero-norm) embedding")
+                return None
+            embedding *= 1.0 / norm
+
+            if key is not None:
+                self._cache_put(key, embedding)
 
-            logger.debug(f"Embedding extracted: shape={embedding.shape}, norm={np.linalg.norm(embedding):.4f}")
+            logger.debug(f"Embedding extracted: shape={embedding.shape}")
             return embedding
 
         except Exception as e:
             logger.error(f"Embedding extraction failed: {e}")
             return None
 
+    def get_embeddings(self, face_images: List[Optional[np.ndarray]]) -> List[Optional[np.ndarray]]:
+        """
+        Extract normalized embeddings for several face crops in one forward pass.
+
+        Args:
+            face_images: Face images (BGR format); None/empty entries are allowed
+
+        Returns:
+            List aligned with face_images: 512-dim normalized embedding, or None
+            for entries that were empty or failed
+        """
+        embeddings: List[Optional[np.ndarray]] = [None] * len(face_images)
+        valid = [i for i, img in enumerate(face_images) if img is not None and img.size > 0]
+
+        # Serve repeats from the cache; only misses go through the model
+        keys = {}
+        if self._cache_size > 0:
+            misses = []
+            for i in valid:
+                keys[i] = self._cache_key(face_images[i])
+                embeddings[i] = self._cache_get(keys[i])
+                if embeddings[i] is None:
+                    misses.append(i)
+            valid = misses
+
+        if not valid:
+            return embeddings
+
+        try:
+            blob = np.empty((len(valid), 3, 112, 112), dtype=np.float32)
+            for row, i in enumerate(valid):
+                self._fill_blob(self._prepare_face(face_images[i]), blob[row])
+            
+            # Single [N, 3, 112, 112] inference
+            feats = np.ascontiguousarray(self._run_rec_model(blob), dtype=np.float32).reshape(len(valid), -1)
+            
+            # Row-wise L2 normalization in place; zero-norm rows stay None
+            norms = np.sqrt(np.einsum("ij,ij->i", feats, feats))
+            ok = norms > _MIN_EMBEDDING_NORM
+            feats[ok] /= norms[ok, None]
+
+            for row, i in enumerate(valid):
+                if ok[row]:
+                    embeddings[i] = feats[row]
+                    if i in keys:
+                        self._cache_put(keys[i], feats[row])
+            return embeddings
+
+        except Exception as e:
+            logger.error(f"Batch embedding extraction failed: {e}")
+            return embeddings
+
     def compute_similarity(
         self,
         embedding1: np.ndarray,
@@ -174,8 +377,8 @@ class InsightFaceMatcher:
         Compute similarity metrics between two embeddings.
 
         Args:
-            embedding1: First face embedding
-            embedding2: Second face embedding
+            embedding1: First face embedding (L2-normalized by get_embedding)
+            embedding2: Second face embedding (L2-normalized by get_embedding)
 
         Returns:
             Dict with cosine_similarity, euclidean_distance, normalized_score
@@ -183,8 +386,9 @@ class InsightFaceMatcher:
         # Cosine similarity (primary metric)
         cosine_sim = float(np.dot(embedding1, embedding2))
 
-        # Euclidean distance (secondary metric)
-        euclidean_dist = float(np.linalg.norm(embedding1 - embedding2))
+        # Euclidean distance (secondary metric) - closed form for unit vectors:
+        # ||a - b||^2 = 2 - 2*cos, so no subtraction/norm pass is needed
+        euclidean_dist = math.sqrt(max(0.0, 2.0 - 2.0 * cosine_sim))
 
         # Normalized score (0-1 range)
         normalized_score = (cosine_sim + (1 - min(euclidean_dist / 2, 1))) / 2
@@ -217,57 +421,143 @@ class InsightFaceMatcher:
 
         logger.info(f"Starting face verification (threshold={threshold})...")
 
-        # Extract embeddings
-        emb1 = self.get_embedding(face1)
-        emb2 = self.get_embedding(face2)
+        # Extract both embeddings in one forward pass
+        emb1, emb2 = self.get_embeddings([face1, face2])
 
-        # Check if embeddings extracted successfully
-        if emb1 is None:
-            logger.warning("Failed to extract embedding from ID face")
-            return FaceMatchResult(
-                verified=False,
-                confidence=0.0,
-                cosine_similarity=0.0,
-                euclidean_distance=999.0,
-                threshold_used=threshold,
-                message="Failed to extract embedding from ID document face"
-            )
+        return self.verify_embeddings(emb1, emb2, threshold=threshold)
+
+    def verify_embeddings(
+        self,
+        emb1: Optional[np.ndarray],
+        emb2: Optional[np.ndarray],
+        threshold: Optional[float] = None
+    ) -> FaceMatchResult:
+        """
+        Verify two precomputed embeddings (from get_embedding).
+        Cheap enough (<1ms) to run directly on the event loop.
 
-        if emb2 is None:
-            logger.warning("Failed to extract embedding from selfie face")
+        Args:
+            emb1: ID document face embedding, or None if extraction failed
+            emb2: Selfie face embedding, or None if extraction failed
+            threshold: Custom threshold. If None, uses self.similarity_threshold
+
+        Returns:
+            FaceMatchResult with verification decision and metrics
+        """
+        if threshold is None:
+            threshold = self.similarity_threshold
+
+        # Check if embeddings extracted successfully (ID face reported first)
+        if emb1 is None or emb2 is None:
+            message = f"Failed to extract embedding from {'ID document' if emb1 is None else 'selfie'} face"
+            logger.warning(message)
             return FaceMatchResult(
                 verified=False,
                 confidence=0.0,
                 cosine_similarity=0.0,
                 euclidean_distance=999.0,
                 threshold_used=threshold,
-                message="Failed to extract embedding from selfie face"
+                message=message
             )
 
         # Compute similarity
         metrics = self.compute_similarity(emb1, emb2)
+        result = self._match_result(metrics, threshold)
+
+        if result.verified:
+            logger.info(f"✓ MATCH: cosine={result.cosine_similarity:.4f} >= threshold={threshold:.4f}")
+        else:
+            logger.info(f"✗ NO MATCH: cosine={result.cosine_similarity:.4f} < threshold={threshold:.4f}")
+
+        return result
+
+    @staticmethod
+    def _match_result(metrics: Dict[str, float], threshold: float) -> FaceMatchResult:
+        """Build the verification decision for one pair from its similarity metrics."""
         cosine_sim = metrics["cosine_similarity"]
-        confidence = metrics["normalized_score"]
 
         # Verify
         verified = cosine_sim >= threshold
 
         if verified:
             message = f"Faces match ({cosine_sim:.1%} similarity)"
-            logger.info(f"✓ MATCH: cosine={cosine_sim:.4f} >= threshold={threshold:.4f}")
         else:
             message = f"Faces do not match ({cosine_sim:.1%} similarity, threshold: {threshold:.1%})"
-            logger.info(f"✗ NO MATCH: cosine={cosine_sim:.4f} < threshold={threshold:.4f}")
 
         return FaceMatchResult(
             verified=verified,
-            confidence=confidence,
+            confidence=metrics["normalized_score"],
             cosine_similarity=cosine_sim,
             euclidean_distance=metrics["euclidean_distance"],
             threshold_used=threshold,
             message=message
         )
 
+    def verify_batch(
+        self,
+        faces1: List[np.ndarray],
+        faces2: List[np.ndarray],
+        threshold: Optional[float] = None
+    ) -> List[List[FaceMatchResult]]:
+        """
+        Verify every face in faces1 against every face in faces2
+        (e.g. one selfie against several document crops).
+        All embeddings come from one forward pass and all similarities
+        from one (N, 512) @ (512, M) matrix product (a numba kernel for
+        small probe-vs-gallery sizes when numba is installed, CuPy on GPU
+        for large ones when use_gpu and cupy is installed).
+
+        Args:
+            faces1: First face images (BGR format)
+            faces2: Second face images (BGR format)
+            threshold: Custom threshold. If None, uses self.similarity_threshold
+
+        Returns:
+            N x M nested list: result[i][j] compares faces1[i] with faces2[j]
+        """
+        if threshold is None:
+            threshold = self.similarity_threshold
+
+        n = len(faces1)
+        embeddings = self.get_embeddings(list(faces1) + list(faces2))
+        embs1, embs2 = embeddings[:n], embeddings[n:]
+        ok1 = [i for i, e in enumerate(embs1) if e is not None]
+        ok2 = [j for j, e in enumerate(embs2) if e is not None]
+
+        # Same closed forms as compute_similarity, over the whole matrix
+        sims = np.zeros((n, len(embs2)), dtype=np.float32)
+        if ok1 and ok2:
+            e1 = np.stack([embs1[i] for i in ok1])
+            e2 = np.stack([embs2[j] for j in ok2])
+            small = len(ok1) * len(ok2) < _SMALL_BATCH_PAIRS
+            if small and _cosine_matrix is not None:
+                sims[np.ix_(ok1, ok2)] = _cosine_matrix(e1, e2)
+            elif not small and self._gpu_matmul:
+                sims[np.ix_(ok1, ok2)] = cupy.asnumpy(cupy.asarray(e1) @ cupy.asarray(e2).T)
+            else:
+                sims[np.ix_(ok1, ok2)] = e1 @ e2.T
+        dists = np.sqrt(np.maximum(0.0, 2.0 - 2.0 * sims))
+        scores = (sims + (1 - np.minimum(dists / 2, 1))) / 2
+
+        results = []
+        for i, emb1 in enumerate(embs1):
+            row = []
+            for j, emb2 in enumerate(embs2):
+                if emb1 is None or emb2 is None:
+                    # Reuses the single-pair failure results/messages
+                    row.append(self.verify_embeddings(emb1, emb2, threshold=threshold))
+                    continue
+                row.append(self._match_result({
+                    "cosine_similarity": float(sims[i, j]),
+                    "euclidean_distance": float(dists[i, j]),
+                    "normalized_score": float(scores[i, j])
+                }, threshold))
+            results.append(row)
+
+        matched = sum(r.verified for row in results for r in row)
+        logger.info(f"Batch verification: {n}x{len(embs2)} pairs, {matched} match(es) (threshold={threshold:.4f})")
+        return results
+
 
 # ============================================================================
 # Singleton Pattern - Thread-safe
@@ -283,9 +573,13 @@ def get_face_matcher() -> InsightFaceMatcher:
     if _matcher_instance is None:
         with _matcher_lock:
             if _matcher_instance is None:
+                ml_workers = config.get("processing", "ml_workers", default=2)
                 _matcher_instance = InsightFaceMatcher(
                     use_gpu=config.use_gpu,
-                    similarity_threshold=config.get("models", "face_recognition", "similarity_threshold", default=0.4)
+                    similarity_threshold=config.get("models", "face_recognition", "similarity_threshold", default=0.4),
+                    intra_op_threads=max(1, (os.cpu_count() or 1) // ml_workers),
+                    embedding_cache_size=config.get("models", "face_recognition", "embedding_cache_size", default=256),
+                    rec_model_path=config.get("models", "face_recognition", "rec_model_path", default=None)
                 )
                 logger.info("Face matcher singleton created")
     return _matcher_instance
@@ -8,18 +8,29 @@ Enhanced with security features (HMAC, nonce, timestamp).
 """
 
 import random
+import secrets
 import hashlib
+import heapq
 import hmac
+import math
+import os
 import time
 import uuid
 import threading
-from typing import Dict, Optional, List, Tuple, Any
+from typing import Dict, Optional, List, Tuple, Any, Union
 from enum import Enum
 from datetime import datetime, timedelta
 
+import orjson
+
 from configs.config import config
 from utils.logger import get_logger
 
+try:
+    import redis
+except ImportError:  # Optional - only needed for the shared Redis challenge store
+    redis = None
+
 logger = get_logger(__name__, log_file="liveness.log")
 
 
@@ -44,6 +55,20 @@ class ChallengeStatus(str, Enum):
 class LivenessChallenge:
     """Represents a liveness challenge session (can contain multiple tasks)."""
     
+    # No per-instance __dict__: one of these is held per active challenge
+    __slots__ = (
+        "challenge_id", "timestamp", "_timestamp_bytes", "nonce", "signature",
+        "expires_at", "status", "challenge_type", "question_text",
+        "challenge_types", "question_texts", "type_values", "instructions"
+    )
+    
+    # User-friendly instruction text per challenge type
+    INSTRUCTIONS = {
+        ChallengeType.BLINK: "Blink your eyes once",
+        ChallengeType.TURN_LEFT: "Turn your face to the left",
+        ChallengeType.TURN_RIGHT: "Turn your face to the right"
+    }
+    
     def __init__(
         self,
         challenge_id: str,
@@ -58,6 +83,8 @@ class LivenessChallenge:
     ):
         self.challenge_id = challenge_id
         self.timestamp = timestamp if timestamp is not None else time.time()
+        # repr(float) == f"{float}", so signatures are unchanged; formatted once here
+        self._timestamp_bytes = repr(self.timestamp).encode('ascii')
         self.nonce = nonce if nonce is not None else uuid.uuid4().hex
         self.signature = signature
         self.expires_at = self.timestamp + expires_in
@@ -77,6 +104,10 @@ class LivenessChallenge:
             self.question_text = question_text
             self.challenge_types = [challenge_type] if challenge_type else []
             self.question_texts = [question_text] if question_text else []
+        
+        # Resolved once; to_dict and signing run on every API request
+        self.type_values = tuple(ct.value for ct in self.challenge_types)
+        self.instructions = [self._get_instruction(ct) for ct in self.challenge_types]
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert challenge to dictionary for API response."""
@@ -84,9 +115,9 @@ class LivenessChallenge:
         if len(self.challenge_types) > 1:
             return {
                 "challenge_id": self.challenge_id,
-                "challenge_types": [ct.value for ct in self.challenge_types],
+                "challenge_types": list(self.type_values),
                 "questions": self.question_texts,
-                "instructions": [self._get_instruction(ct) for ct in self.challenge_types],
+                "instructions": self.instructions,
                 "timestamp": self.timestamp,
                 "expires_at": self.expires_at,
                 "nonce": self.nonce,
@@ -97,9 +128,9 @@ class LivenessChallenge:
             # Single challenge response (backward compatibility)
             return {
                 "challenge_id": self.challenge_id,
-                "challenge_type": self.challenge_type.value if self.challenge_type else None,
+                "challenge_type": self.type_values[0] if self.type_values else None,
                 "question": self.question_text,
-                "instruction": self._get_instruction(self.challenge_type),
+                "instruction": self.instructions[0] if self.instructions else self._get_instruction(),
                 "timestamp": self.timestamp,
                 "expires_at": self.expires_at,
                 "nonce": self.nonce,
@@ -112,36 +143,244 @@ class LivenessChallenge:
         if challenge_type is None:
             challenge_type = self.challenge_type
         
-        instructions = {
-            ChallengeType.BLINK: "Blink your eyes once",
-            ChallengeType.TURN_LEFT: "Turn your face to the left",
-            ChallengeType.TURN_RIGHT: "Turn your face to the right"
+        return self.INSTRUCTIONS.get(challenge_type, self.question_text if hasattr(self, 'question_text') else "")
+    
+    def to_record(self) -> Dict[str, Any]:
+        """Storage form of the challenge (see RedisChallengeStore)."""
+        return {
+            "challenge_id": self.challenge_id,
+            "challenge_types": list(self.type_values),
+            "question_texts": self.question_texts,
+            "timestamp": self.timestamp,
+            "expires_at": self.expires_at,
+            "nonce": self.nonce,
+            "signature": self.signature
         }
-        return instructions.get(challenge_type, self.question_text if hasattr(self, 'question_text') else "")
+    
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "LivenessChallenge":
+        """Rebuild a challenge from to_record() output."""
+        return cls(
+            challenge_id=record["challenge_id"],
+            challenge_types=[ChallengeType(v) for v in record["challenge_types"]],
+            question_texts=record["question_texts"],
+            timestamp=record["timestamp"],
+            nonce=record["nonce"],
+            signature=record["signature"],
+            expires_in=record["expires_at"] - record["timestamp"]
+        )
     
     def is_expired(self) -> bool:
         """Check if challenge has expired."""
         return time.time() > self.expires_at
     
-    def verify_signature(self, secret_key: str) -> bool:
-        """Verify HMAC signature of challenge."""
+    def verify_signature(self, secret_key: Union[str, "hmac.HMAC"]) -> bool:
+        """Verify HMAC signature of challenge (secret_key as for _generate_signature)."""
         if not self.signature:
             return False
         
-        expected_signature = self._generate_signature(secret_key)
-        return hmac.compare_digest(self.signature, expected_signature)
+        # Compare the 32 raw digest bytes rather than 64 hex characters
+        try:
+            signature = bytes.fromhex(self.signature)
+        except ValueError:
+            return False
+        return hmac.compare_digest(signature, self._signature_mac(secret_key).digest())
+    
+    def _generate_signature(self, secret_key: Union[str, "hmac.HMAC"]) -> str:
+        """
+        Generate HMAC signature for challenge (hex, as sent to clients).
+        
+        Args:
+            secret_key: Secret key, or a pre-keyed HMAC-SHA256 template
+        """
+        return self._signature_mac(secret_key).hexdigest()
     
-    def _generate_signature(self, secret_key: str) -> str:
-        """Generate HMAC signature for challenge."""
+    def _signature_mac(self, secret_key: Union[str, "hmac.HMAC"]) -> "hmac.HMAC":
+        """
+        HMAC-SHA256 over the challenge fields.
+        
+        Args:
+            secret_key: Secret key, or a pre-keyed HMAC-SHA256 template. A template is
+                        copied per call, reusing its already-derived inner/outer pads.
+        """
         # Include all challenge types in signature
-        challenge_str = ",".join([ct.value for ct in self.challenge_types])
-        message = f"{self.challenge_id}:{challenge_str}:{self.timestamp}:{self.nonce}"
-        signature = hmac.new(
-            secret_key.encode('utf-8'),
-            message.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
-        return signature
+        # Same bytes as f"{challenge_id}:{types}:{timestamp}:{nonce}".encode(), built without the f-string
+        message = b":".join((
+            self.challenge_id.encode('utf-8'),
+            ",".join(self.type_values).encode('utf-8'),
+            self._timestamp_bytes,
+            self.nonce.encode('utf-8')
+        ))
+        if isinstance(secret_key, hmac.HMAC):
+            mac = secret_key.copy()
+            mac.update(message)
+        else:
+            mac = hmac.new(
+                secret_key.encode('utf-8'),
+                message,
+                hashlib.sha256
+            )
+        return mac
+
+
+# ============================================================================
+# Challenge Stores
+# ============================================================================
+
+class InMemoryChallengeStore:
+    """
+    Process-local challenge store (single worker / development).
+    Expiry is tracked in a min-heap of (expires_at, challenge_id) so cleanup only
+    touches expired entries; entries for challenges removed early are skipped lazily.
+    """
+    
+    shared = False
+    
+    # Sweep expired challenges every N stored challenges
+    CLEANUP_EVERY = 64
+    
+    def __init__(self):
+        self._challenges: Dict[str, LivenessChallenge] = {}
+        self._expiry_heap: List[Tuple[float, str]] = []
+        # Guards every write (the generator is a singleton shared by request threads);
+        # lookups stay lock-free dict reads
+        self._lock = threading.Lock()
+        self._stored_count = 0
+    
+    def put(self, challenge: LivenessChallenge) -> None:
+        with self._lock:
+            self._challenges[challenge.challenge_id] = challenge
+            heapq.heappush(self._expiry_heap, (challenge.expires_at, challenge.challenge_id))
+            self._stored_count += 1
+            sweep = self._stored_count % self.CLEANUP_EVERY == 0
+        
+        # Bound memory without a background thread
+        if sweep:
+            self.cleanup_expired()
+    
+    def get(self, challenge_id: str) -> Optional[LivenessChallenge]:
+        return self._challenges.get(challenge_id)
+    
+    def get_many(self, challenge_ids: List[str]) -> List[Optional[LivenessChallenge]]:
+        challenges = self._challenges
+        return [challenges.get(cid) for cid in challenge_ids]
+    
+    def discard(self, challenge_id: str) -> bool:
+        """Remove a challenge; True only for the caller that actually removed it."""
+        with self._lock:
+            return self._challenges.pop(challenge_id, None) is not None
+    
+    def cleanup_expired(self) -> int:
+        """Remove expired challenges; returns how many were removed."""
+        current_time = time.time()
+        removed = 0
+        
+        with self._lock:
+            heap = self._expiry_heap
+            while heap and heap[0][0] < current_time:
+                expires_at, cid = heapq.heappop(heap)
+                challenge = self._challenges.get(cid)
+                # Skip stale entries (challenge already consumed/removed)
+                if challenge is not None and challenge.expires_at == expires_at:
+                    self._challenges.pop(cid, None)
+                    removed += 1
+        
+        return removed
+    
+    def count(self) -> int:
+        return len(self._challenges)
+
+
+class RedisChallengeStore:
+    """
+    Redis-backed challenge store shared by all workers/replicas, so a challenge
+    issued by one uvicorn worker can be verified by another. Entries are written
+    with SET ... EX, so Redis expires them and no Python-side cleanup is needed.
+    """
+    
+    shared = True
+    KEY_PREFIX = "liveness:challenge:"
+    
+    def __init__(self, url: str):
+        if redis is None:
+            raise ImportError("Redis challenge store requires the 'redis' package")
+        # from_url builds a connection pool shared by all request threads
+        self._redis = redis.Redis.from_url(url)
+        logger.info(f"Redis challenge store: {url.split('@')[-1]}")
+    
+    def put(self, challenge: LivenessChallenge) -> None:
+        ttl = max(1, int(math.ceil(challenge.expires_at - time.time())))
+        self._redis.set(self.KEY_PREFIX + challenge.challenge_id, orjson.dumps(challenge.to_record()), ex=ttl)
+    
+    def get(self, challenge_id: str) -> Optional[LivenessChallenge]:
+        payload = self._redis.get(self.KEY_PREFIX + challenge_id)
+        if payload is None:
+            return None
+        return LivenessChallenge.from_record(orjson.loads(payload))
+    
+    def get_many(self, challenge_ids: List[str]) -> List[Optional[LivenessChallenge]]:
+        # One MGET round trip for the whole batch
+        if not challenge_ids:
+            return []
+        payloads = self._redis.mget([self.KEY_PREFIX + cid for cid in challenge_ids])
+        return [
+            LivenessChallenge.from_record(orjson.loads(p)) if p is not None else None
+            for p in payloads
+        ]
+    
+    def discard(self, challenge_id: str) -> bool:
+        """Remove a challenge; True only for the caller whose DEL removed the key."""
+        # DEL is atomic, so of several workers racing on one challenge exactly one gets 1
+        return self._redis.delete(self.KEY_PREFIX + challenge_id) == 1
+    
+    def cleanup_expired(self) -> int:
+        return 0  # Redis expires keys itself
+    
+    def count(self) -> int:
+        return sum(1 for _ in self._redis.scan_iter(match=self.KEY_PREFIX + "*", count=1000))
+
+
+def create_challenge_store():
+    """Build the challenge store selected by liveness.challenge.store ("memory" or "redis")."""
+    backend = config.get("liveness", "challenge", "store", default="memory")
+    if backend == "redis":
+        url = os.environ.get("REDIS_URL") or config.get("liveness", "challenge", "redis_url", default="redis://localhost:6379/0")
+        return RedisChallengeStore(url)
+    if backend != "memory":
+        logger.warning(f"Unknown challenge store '{backend}', using in-memory store")
+    return InMemoryChallengeStore()
+
+
+# ============================================================================
+# Single-Challenge Checks
+# ============================================================================
+
+def _check_blink(detection_results: Dict[str, Any]) -> Tuple[bool, str]:
+    if detection_results.get("blinks", 0) >= 1:
+        return True, "Blink detected successfully"
+    return False, "No blink detected"
+
+
+def _check_turn_left(detection_results: Dict[str, Any]) -> Tuple[bool, str]:
+    orientation = detection_results.get("orientation")
+    if orientation == "left":
+        return True, "Left orientation detected"
+    return False, f"Expected left, got {orientation}"
+
+
+def _check_turn_right(detection_results: Dict[str, Any]) -> Tuple[bool, str]:
+    orientation = detection_results.get("orientation")
+    if orientation == "right":
+        return True, "Right orientation detected"
+    return False, f"Expected right, got {orientation}"
+
+
+# Challenge type -> check(detection_results) -> (passed, message)
+_SINGLE_CHALLENGE_CHECKS = {
+    ChallengeType.BLINK: _check_blink,
+    ChallengeType.TURN_LEFT: _check_turn_left,
+    ChallengeType.TURN_RIGHT: _check_turn_right
+}
 
 
 class ChallengeGenerator:
@@ -162,13 +401,14 @@ class ChallengeGenerator:
         ChallengeType.TURN_RIGHT: "turn face right"
     }
     
-    def __init__(self, secret_key: Optional[str] = None, expires_in: Optional[int] = None):
+    def __init__(self, secret_key: Optional[str] = None, expires_in: Optional[int] = None, store=None):
         """
         Initialize challenge generator.
         
         Args:
             secret_key: Secret key for HMAC signing (uses config if None)
             expires_in: Challenge expiration time in seconds (uses config if None)
+            store: Challenge store (InMemoryChallengeStore / RedisChallengeStore; uses config if None)
         """
         if secret_key is None:
             secret_key = config.get("liveness", "security", "hmac_secret", default="change-me-in-production")
@@ -178,12 +418,14 @@ class ChallengeGenerator:
         
         self.secret_key = secret_key
         self.expires_in = expires_in
+        # Keyed once; signing/verifying copies it instead of re-deriving the key pads
+        self._hmac_template = hmac.new(secret_key.encode('utf-8'), digestmod=hashlib.sha256)
         
-        # In-memory challenge storage (for validation)
-        # In production, consider Redis or database
-        self._active_challenges: Dict[str, LivenessChallenge] = {}
+        # Challenge storage (for validation): in-memory per process, or Redis when
+        # several workers/replicas must validate each other's challenges
+        self._store = store if store is not None else create_challenge_store()
         
-        logger.info(f"ChallengeGenerator initialized (expires_in: {expires_in}s)")
+        logger.info(f"ChallengeGenerator initialized (expires_in: {expires_in}s, store: {type(self._store).__name__})")
     
     def generate_challenge(self, challenge_type: Optional[ChallengeType] = None, num_challenges: int = 2) -> LivenessChallenge:
         """
@@ -196,9 +438,11 @@ class ChallengeGenerator:
         Returns:
             LivenessChallenge object
         """
-        challenge_id = str(uuid.uuid4())
+        # One 32-byte CSPRNG draw for both: a UUID4-formatted id and a 128-bit hex nonce
+        raw = secrets.token_bytes(32)
+        challenge_id = str(uuid.UUID(bytes=raw[:16], version=4))
         timestamp = time.time()
-        nonce = uuid.uuid4().hex
+        nonce = raw[16:].hex()
         
         # Multi-challenge mode (default)
         if num_challenges > 1:
@@ -233,10 +477,10 @@ class ChallengeGenerator:
             logger.info(f"Generated challenge: {challenge_type.value} (ID: {challenge_id})")
         
         # Generate signature
-        challenge.signature = challenge._generate_signature(self.secret_key)
+        challenge.signature = challenge._generate_signature(self._hmac_template)
         
         # Store for validation
-        self._active_challenges[challenge_id] = challenge
+        self._store.put(challenge)
         
         return challenge
     
@@ -251,23 +495,15 @@ class ChallengeGenerator:
         Returns:
             List of LivenessChallenge objects
         """
-        challenges = []
-        used_types = set()
+        # Pick all types up front: unique types come in shuffled rounds over the type list
+        if allow_duplicates:
+            types = random.choices(self.CHALLENGE_TYPES, k=count)
+        else:
+            types = []
+            while len(types) < count:
+                types += random.sample(self.CHALLENGE_TYPES, min(count - len(types), len(self.CHALLENGE_TYPES)))
         
-        for _ in range(count):
-            if not allow_duplicates and len(used_types) >= len(self.CHALLENGE_TYPES):
-                # Reset if we've used all types
-                used_types.clear()
-            
-            challenge_type = None
-            while challenge_type is None or (not allow_duplicates and challenge_type in used_types):
-                challenge_type = random.choice(self.CHALLENGE_TYPES)
-            
-            if not allow_duplicates:
-                used_types.add(challenge_type)
-            
-            challenge = self.generate_challenge(challenge_type)
-            challenges.append(challenge)
+        challenges = [self.generate_challenge(challenge_type, num_challenges=1) for challenge_type in types]
         
         return challenges
     
@@ -281,18 +517,43 @@ class ChallengeGenerator:
         Returns:
             Tuple of (is_valid, challenge)
         """
-        challenge = self._active_challenges.get(challenge_id)
+        return self._check_challenge(challenge_id, self._store.get(challenge_id), time.time())
+    
+    def validate_challenges(self, challenge_ids: List[str]) -> List[Tuple[bool, Optional[LivenessChallenge]]]:
+        """
+        Batch form of validate_challenge: one store lookup (a single MGET with Redis)
+        and one clock read for all challenges.
+        
+        Args:
+            challenge_ids: Challenge IDs to validate
         
+        Returns:
+            List of (is_valid, challenge), in input order
+        """
+        now = time.time()
+        challenges = self._store.get_many(challenge_ids)
+        return [self._check_challenge(cid, ch, now) for cid, ch in zip(challenge_ids, challenges)]
+    
+    def _check_challenge(
+        self,
+        challenge_id: str,
+        challenge: Optional[LivenessChallenge],
+        now: float
+    ) -> Tuple[bool, Optional[LivenessChallenge]]:
+        """Existence, expiry and (for shared stores) signature checks for a looked-up challenge."""
         if challenge is None:
             logger.warning(f"Challenge not found: {challenge_id}")
             return False, None
         
-        if challenge.is_expired():
+        if now > challenge.expires_at:
             logger.warning(f"Challenge expired: {challenge_id}")
-            self._active_challenges.pop(challenge_id, None)
+            self._discard(challenge_id)
             return False, None
         
-        if not challenge.verify_signature(self.secret_key):
+        # In-memory challenges need no signature check: the HMAC would only re-authenticate
+        # data this process wrote. Challenges read back from a shared store are verified,
+        # since that data crossed the network.
+        if self._store.shared and not challenge.verify_signature(self._hmac_template):
             logger.warning(f"Challenge signature invalid: {challenge_id}")
             return False, None
         
@@ -318,12 +579,45 @@ class ChallengeGenerator:
             Tuple of (status, message)
         """
         is_valid, challenge = self.validate_challenge(challenge_id)
+        return self._validate_checked_response(is_valid, challenge, detection_results)
+    
+    def validate_response_batch(
+        self,
+        checked: List[Tuple[bool, Optional[LivenessChallenge]]],
+        detection_results: List[Dict[str, Any]]
+    ) -> List[Tuple[ChallengeStatus, Optional[str]]]:
+        """
+        Validate several challenge responses at once.
         
+        Args:
+            checked: validate_challenges() output for the batch (not looked up again, so a
+                     challenge that expires while its frames are processed is still judged)
+            detection_results: Detection results per challenge, as for validate_response
+        
+        Returns:
+            List of (status, message), in input order
+        """
+        return [
+            self._validate_checked_response(is_valid, challenge, det)
+            for (is_valid, challenge), det in zip(checked, detection_results)
+        ]
+    
+    def _validate_checked_response(
+        self,
+        is_valid: bool,
+        challenge: Optional[LivenessChallenge],
+        detection_results: Dict[str, Any]
+    ) -> Tuple[ChallengeStatus, Optional[str]]:
+        """Validate detection results against a challenge already run through _check_challenge."""
         if not is_valid or challenge is None:
             return ChallengeStatus.INVALID, "Challenge not found or expired"
         
+        # Single use: a challenge already passed (e.g. the same id earlier in a batch) is spent
+        if challenge.status != ChallengeStatus.PENDING:
+            return ChallengeStatus.INVALID, "Challenge already used"
+        
         if challenge.is_expired():
-            self._active_challenges.pop(challenge_id, None)
+            self._discard(challenge.challenge_id)
             return ChallengeStatus.EXPIRED, "Challenge expired"
         
         # Multi-challenge validation
@@ -339,35 +633,17 @@ class ChallengeGenerator:
         detection_results: Dict[str, Any]
     ) -> Tuple[ChallengeStatus, Optional[str]]:
         """Validate a single challenge."""
-        # Validate based on challenge type
-        if challenge.challenge_type == ChallengeType.BLINK:
-            blinks = detection_results.get("blinks", 0)
-            if blinks >= 1:
-                challenge.status = ChallengeStatus.PASS
-                self._active_challenges.pop(challenge.challenge_id, None)
-                return ChallengeStatus.PASS, "Blink detected successfully"
-            else:
-                return ChallengeStatus.FAIL, "No blink detected"
-        
-        elif challenge.challenge_type == ChallengeType.TURN_LEFT:
-            orientation = detection_results.get("orientation")
-            if orientation == "left":
-                challenge.status = ChallengeStatus.PASS
-                self._active_challenges.pop(challenge.challenge_id, None)
-                return ChallengeStatus.PASS, "Left orientation detected"
-            else:
-                return ChallengeStatus.FAIL, f"Expected left, got {orientation}"
-        
-        elif challenge.challenge_type == ChallengeType.TURN_RIGHT:
-            orientation = detection_results.get("orientation")
-            if orientation == "right":
-                challenge.status = ChallengeStatus.PASS
-                self._active_challenges.pop(challenge.challenge_id, None)
-                return ChallengeStatus.PASS, "Right orientation detected"
-            else:
-                return ChallengeStatus.FAIL, f"Expected right, got {orientation}"
-        
-        return ChallengeStatus.INVALID, "Unknown challenge type"
+        check = _SINGLE_CHALLENGE_CHECKS.get(challenge.challenge_type)
+        if check is None:
+            return ChallengeStatus.INVALID, "Unknown challenge type"
+        
+        passed, message = check(detection_results)
+        if not passed:
+            return ChallengeStatus.FAIL, message
+        
+        if not self._consume(challenge):
+            return ChallengeStatus.INVALID, "Challenge already used"
+        return ChallengeStatus.PASS, message
     
     def _validate_multi_challenge(
         self,
@@ -377,9 +653,13 @@ class ChallengeGenerator:
         """
         Validate multiple challenges completed in a single video.
         All challenges must be completed successfully.
+        detection_results["orientations"] may be a per-frame list or an already-built set.
         """
         blinks = detection_results.get("blinks", 0)
+        # One pass to a set; each turn check below is then O(1) instead of a scan of every frame
         orientations = detection_results.get("orientations", [])
+        if not isinstance(orientations, (set, frozenset)):
+            orientations = set(orientations)
         
         # Track which challenges were completed
         completed_challenges = []
@@ -414,8 +694,8 @@ class ChallengeGenerator:
         
         # All challenges must be completed
         if len(completed_challenges) == len(challenge.challenge_types):
-            challenge.status = ChallengeStatus.PASS
-            self._active_challenges.pop(challenge.challenge_id, None)
+            if not self._consume(challenge):
+                return ChallengeStatus.INVALID, "Challenge already used"
             message = f"All challenges completed: {', '.join(completed_challenges)}"
             logger.info(f"✅ Multi-challenge PASSED: {message}")
             return ChallengeStatus.PASS, message
@@ -432,23 +712,31 @@ class ChallengeGenerator:
         Returns:
             Number of challenges removed
         """
-        current_time = time.time()
-        expired_ids = [
-            cid for cid, challenge in self._active_challenges.items()
-            if challenge.expires_at < current_time
-        ]
+        removed = self._store.cleanup_expired()
         
-        for cid in expired_ids:
-            self._active_challenges.pop(cid, None)
+        if removed:
+            logger.info(f"Cleaned up {removed} expired challenges")
         
-        if expired_ids:
-            logger.info(f"Cleaned up {len(expired_ids)} expired challenges")
-        
-        return len(expired_ids)
+        return removed
+    
+    def _discard(self, challenge_id: str) -> bool:
+        """Remove a challenge from the store; True if this call removed it."""
+        return self._store.discard(challenge_id)
+    
+    def _consume(self, challenge: LivenessChallenge) -> bool:
+        """
+        Spend a passed challenge. Only the caller that removes it from the store may
+        report PASS; another request/worker that read the same challenge loses the race.
+        """
+        if not self._discard(challenge.challenge_id):
+            logger.warning(f"Challenge already used: {challenge.challenge_id}")
+            return False
+        challenge.status = ChallengeStatus.PASS
+        return True
     
     def get_challenge_count(self) -> int:
         """Get number of active challenges."""
-        return len(self._active_challenges)
+        return self._store.count()
 
 
 # ============================================================================
@@ -514,29 +802,23 @@ def challenge_result(
     Returns:
         "pass" or "fail"
     """
-    if question == "blink eyes":
-        if blinks_up >= 1:
-            return "pass"
-        else:
-            return "fail"
-    
-    elif question == "turn face left":
-        orientation = detection_results.get("orientation", [])
-        if isinstance(orientation, list):
-            orientation = orientation[0] if len(orientation) > 0 else None
-        if orientation == "left":
-            return "pass"
-        else:
-            return "fail"
-    
-    elif question == "turn face right":
-        orientation = detection_results.get("orientation", [])
-        if isinstance(orientation, list):
-            orientation = orientation[0] if len(orientation) > 0 else None
-        if orientation == "right":
-            return "pass"
-        else:
-            return "fail"
-    
-    return "fail"
+    check = _QUESTION_CHECKS.get(question)
+    if check is None:
+        return "fail"
+    return "pass" if check(detection_results, blinks_up) else "fail"
+
+
+def _legacy_orientation(detection_results: Dict[str, Any]) -> Optional[str]:
+    """Orientation from legacy results (a list of per-face orientations or a single value)."""
+    orientation = detection_results.get("orientation", [])
+    if isinstance(orientation, list):
+        orientation = orientation[0] if len(orientation) > 0 else None
+    return orientation
+
 
+# Question text -> check(detection_results, blinks_up) -> passed
+_QUESTION_CHECKS = {
+    "blink eyes": lambda detection_results, blinks_up: blinks_up >= 1,
+    "turn face left": lambda detection_results, blinks_up: _legacy_orientation(detection_results) == "left",
+    "turn face right": lambda detection_results, blinks_up: _legacy_orientation(detection_results) == "right"
+}
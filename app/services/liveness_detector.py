@@ -11,7 +11,6 @@ import numpy as np
 from typing import Dict, List, Optional, Tuple, Any
 import threading
 import time
-from collections import Counter
 
 from app.services.blink_detector import get_blink_detector, BlinkDetector
 from app.services.profile_detector import get_profile_detector, ProfileDetector
@@ -19,12 +18,55 @@ from app.services.liveness_challenges import ChallengeGenerator, ChallengeType,
 from configs.config import config
 from utils.logger import get_logger
 
+try:
+    from numba import njit
+    _HAVE_NUMBA = True
+except ImportError:  # Optional dependency - the majority count then runs as plain Python
+    _HAVE_NUMBA = False
+    
+    def njit(*args, **kwargs):
+        return lambda fn: fn
+
 logger = get_logger(__name__, log_file="liveness.log")
 
+# Orientation <-> int8 code (0 = no orientation detected)
+_ORIENT_CODE = {None: 0, "left": 1, "right": 2}
+_ORIENT_NAME = (None, "left", "right")
+
+
+@njit(cache=True)
+def _majority_orientation(codes):
+    """
+    Most common non-zero orientation code in one pass (0 if none).
+    Ties go to the code seen first.
+    """
+    left = 0
+    right = 0
+    first = 0
+    for i in range(codes.shape[0]):
+        c = codes[i]
+        if c == 1:
+            left += 1
+        elif c == 2:
+            right += 1
+        else:
+            continue
+        if first == 0:
+            first = c
+    if left == right:
+        return first
+    return 1 if left > right else 2
+
 
 class LivenessDetectionResult:
     """Encapsulates liveness detection results."""
     
+    # No per-instance __dict__: detect_batch builds one of these per frame
+    __slots__ = (
+        "blinks", "orientation", "orientation_box", "face_detected",
+        "face_box", "ear_value", "is_blinking"
+    )
+    
     def __init__(
         self,
         blinks: int = 0,
@@ -83,17 +125,22 @@ class LivenessDetector:
         Initialize liveness detector with component detectors.
         
         Args:
-            blink_detector: BlinkDetector instance (uses singleton if None)
+            blink_detector: BlinkDetector instance (uses the calling thread's instance if None)
             profile_detector: ProfileDetector instance (uses singleton if None)
             challenge_generator: ChallengeGenerator instance (uses singleton if None)
         """
         from app.services.liveness_challenges import get_challenge_generator
-        self.blink_detector = blink_detector or get_blink_detector()
+        self._blink_detector = blink_detector  # None = per-thread instance (see blink_detector)
         self.profile_detector = profile_detector or get_profile_detector()
         self.challenge_generator = challenge_generator or get_challenge_generator()
         
         logger.info("LivenessDetector initialized")
     
+    @property
+    def blink_detector(self) -> BlinkDetector:
+        """Explicitly injected BlinkDetector, else the calling thread's own instance."""
+        return self._blink_detector or get_blink_detector()
+    
     def detect_frame(
         self,
         image: np.ndarray,
@@ -121,8 +168,8 @@ class LivenessDetector:
         # 1. Blink detection (works on BGR image)
         counter, total, ear, is_blinking = self.blink_detector.detect_blink_frame(image, counter, total)
         
-        # 2. Profile/Orientation detection (works on grayscale)
-        orientation_result = self.profile_detector.detect_orientation_frame(image)
+        # 2. Profile/Orientation detection (works on grayscale; reuses the conversion above)
+        orientation_result = self.profile_detector.detect_orientation_frame(gray)
         
         # 3. Build result object
         result = LivenessDetectionResult(
@@ -162,28 +209,49 @@ class LivenessDetector:
                 "results": []
             }
         
-        results_list = []
-        counter = initial_counter
-        total = initial_total
-        
-        # Process each frame
-        for i, frame in enumerate(frames):
-            result, counter, total = self.detect_frame(frame, counter, total)
-            results_list.append(result.to_dict())
+        n = len(frames)
         
-        # Get batch orientation detection results
+        # One pass of each detector over the whole batch (blink EARs and the blink
+        # state machine are vectorized in detect_blinks_batch)
+        blink_batch = self.blink_detector.detect_blinks_batch(frames, initial_counter, initial_total)
         orientation_batch = self.profile_detector.detect_orientation_batch(frames)
         
+        total = blink_batch["final_total"]
+        ear_values = blink_batch["ear_values"]
+        is_blinking = blink_batch["is_blinking"]
+        orientations = orientation_batch["orientations"]
+        orientation_boxes = orientation_batch["boxes"]
+        # Running blink total at each frame
+        running_totals = initial_total + np.searchsorted(
+            np.asarray(blink_batch["blink_frames"], dtype=np.int64), np.arange(n), side="right"
+        )
+        
+        results_list = [
+            LivenessDetectionResult(
+                blinks=int(running_totals[i]),
+                orientation=orientations[i],
+                orientation_box=orientation_boxes[i],
+                face_detected=ear_values[i] < 1.0,  # EAR < 1.0 means face was detected
+                face_box=None,  # MediaPipe doesn't provide face box, only landmarks
+                ear_value=ear_values[i],
+                is_blinking=is_blinking[i]
+            ).to_dict()
+            for i in range(n)
+        ]
+        
         # Aggregate results
         new_blinks = total - initial_total
-        orientations_detected = [r.get("orientation") for r in results_list if r.get("orientation")]
+        orientation_codes = np.fromiter(
+            (_ORIENT_CODE.get(o, 0) for o in orientations), dtype=np.int8, count=len(orientations)
+        )
         face_detected_count = sum(1 for r in results_list if r.get("face_detected"))
         face_detection_ratio = face_detected_count / len(frames) if len(frames) > 0 else 0.0
         
         return {
             "total_blinks": new_blinks,
             "final_blink_count": total,
-            "orientations": [r.get("orientation") for r in results_list],
+            "orientations": orientations,
+            "primary_orientation": self._get_primary_orientation(orientation_codes),
             "left_orientations": orientation_batch.get("left_frames", []),
             "right_orientations": orientation_batch.get("right_frames", []),
             "face_detection_ratio": face_detection_ratio,
@@ -223,15 +291,7 @@ class LivenessDetector:
         
         # Detect liveness in frames
         batch_results = self.detect_batch(frames, initial_counter, initial_total)
-        
-        # Extract detection results for validation
-        # Include both individual orientation and full orientations list for multi-challenge
-        detection_results = {
-            "blinks": batch_results.get("total_blinks", 0),
-            "orientation": self._get_primary_orientation(batch_results.get("orientations", [])),
-            "orientations": batch_results.get("orientations", []),  # Full list for multi-challenge
-            "face_detected": batch_results.get("face_detection_ratio", 0.0) > 0.5
-        }
+        detection_results = self._detection_results(batch_results)
         
         # Validate challenge response
         status, message = self.challenge_generator.validate_response(challenge_id, detection_results)
@@ -241,28 +301,91 @@ class LivenessDetector:
             "batch_results": batch_results
         }
     
-    def _get_primary_orientation(self, orientations: List[Optional[str]]) -> Optional[str]:
+    def verify_challenges(
+        self,
+        items: List[Tuple[str, List[np.ndarray]]]
+    ) -> List[Tuple[ChallengeStatus, str, Dict[str, Any]]]:
         """
-        Get primary orientation from list (most common).
+        Verify several liveness challenges, each with its own frame sequence.
+        Challenges are looked up once for the whole batch (see
+        ChallengeGenerator.validate_challenges) and judged against that lookup;
+        frames are only processed for challenges that are still valid.
+        Repeated challenge ids are INVALID after their first occurrence.
         
         Args:
-            orientations: List of detected orientations
+            items: List of (challenge_id, frames)
         
         Returns:
-            Most common orientation or None
+            List of (status, message, detection_results) as for verify_challenge, in input order
         """
-        if not orientations:
-            return None
+        outcomes: List[Optional[Tuple[ChallengeStatus, str, Dict[str, Any]]]] = [None] * len(items)
+        checked = self.challenge_generator.validate_challenges([cid for cid, _ in items])
+        
+        pending = []  # (index, (is_valid, challenge), batch_results)
+        seen = set()
+        for i, ((challenge_id, frames), (is_valid, challenge)) in enumerate(zip(items, checked)):
+            if challenge_id in seen:
+                # Challenges are single use; a repeated id must not be judged twice
+                outcomes[i] = (ChallengeStatus.INVALID, "Duplicate challenge_id in batch", {})
+                continue
+            seen.add(challenge_id)
+            
+            if not frames:
+                outcomes[i] = (ChallengeStatus.FAIL, "No frames provided", {})
+            elif not is_valid or challenge is None:
+                logger.warning(f"Challenge validation failed for {challenge_id}: is_valid={is_valid}")
+                outcomes[i] = (ChallengeStatus.INVALID, "Challenge not found or expired. Please generate a new challenge.", {})
+            else:
+                pending.append((i, (is_valid, challenge), self.detect_batch(frames)))
         
-        # Filter out None values
-        valid_orientations = [o for o in orientations if o is not None]
+        # Judge against the challenges looked up above (no second store round trip)
+        detection_results = [self._detection_results(batch_results) for _, _, batch_results in pending]
+        verdicts = self.challenge_generator.validate_response_batch(
+            [checked_item for _, checked_item, _ in pending], detection_results
+        )
+        for (i, _, batch_results), det, (status, message) in zip(pending, detection_results, verdicts):
+            outcomes[i] = (status, message, {
+                "detection_results": det,
+                "batch_results": batch_results
+            })
         
-        if not valid_orientations:
-            return None
+        return outcomes
+    
+    @staticmethod
+    def _detection_results(batch_results: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Extract detection results for challenge validation from detect_batch output.
+        Includes both the primary orientation and the full orientations list (multi-challenge).
+        """
+        return {
+            "blinks": batch_results.get("total_blinks", 0),
+            "orientation": batch_results.get("primary_orientation"),
+            "orientations": batch_results.get("orientations", []),  # Full list for multi-challenge
+            "face_detected": batch_results.get("face_detection_ratio", 0.0) > 0.5
+        }
+    
+    def _get_primary_orientation(self, codes: np.ndarray) -> Optional[str]:
+        """
+        Get primary orientation (most common) from per-frame orientation codes.
+        Ties go to the orientation seen first.
+        
+        Args:
+            codes: int8 array of per-frame orientation codes (see _ORIENT_CODE)
+        
+        Returns:
+            Most common orientation or None
+        """
+        # Compiled single pass with numba; without it, plain Python only for a few frames
+        if _HAVE_NUMBA or len(codes) <= 4:
+            return _ORIENT_NAME[_majority_orientation(codes)]
         
-        # Count occurrences
-        counts = Counter(valid_orientations)
-        return counts.most_common(1)[0][0]
+        counts = np.bincount(codes, minlength=3)
+        left, right = int(counts[1]), int(counts[2])
+        if left == right:
+            if left == 0:
+                return None
+            return _ORIENT_NAME[int(codes[np.flatnonzero(codes)[0]])]
+        return "left" if left > right else "right"
     
     def detect_liveness(
         self,
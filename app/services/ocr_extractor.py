@@ -6,11 +6,12 @@ Version: 2.0
 """
 
 from paddleocr import PaddleOCR
+import os
 import re
 import cv2
 import numpy as np
-from typing import Optional, List, Dict, Any, Tuple
-from dataclasses import dataclass, asdict, field
+from typing import Optional, List, Dict, Any, Tuple, FrozenSet
+from dataclasses import dataclass, asdict, field, fields
 from enum import Enum
 import threading
 from datetime import datetime
@@ -93,15 +94,29 @@ class OCRResult:
     extracted_text: str = ""
     field_confidence_scores: Dict[str, float] = field(default_factory=dict)
     
-    def to_dict(self) -> Dict[str, Any]:
-        """Convert to API response, omit None values."""
+    def to_dict(self, only: Optional[FrozenSet[str]] = None) -> Dict[str, Any]:
+        """
+        Convert to API response, omit None values.
+        
+        Args:
+            only: If given, materialize just these field names (e.g. the OCRFields keys)
+        
+        Returns:
+            Dict of non-empty fields. Values are not deep-copied (unlike asdict).
+        """
+        names = _OCR_RESULT_FIELDS if only is None else only
         result = {}
-        for k, v in asdict(self).items():
+        for k in names:
+            v = getattr(self, k, None)
             if v is not None and v != {} and v != "":
                 result[k] = v
         return result
 
 
+# Field names in declaration order, computed once
+_OCR_RESULT_FIELDS = tuple(f.name for f in fields(OCRResult))
+
+
 class MRZParser:
     """Parse Machine Readable Zone from passports and IDs."""
     
@@ -420,7 +435,13 @@ class ContextualExtractor:
 class PaddleOCRExtractor:
     """Production-grade PaddleOCR extractor with context-aware extraction."""
 
-    def __init__(self, languages: Optional[List[str]] = None):
+    def __init__(self, languages: Optional[List[str]] = None, cpu_threads: Optional[int] = None):
+        """
+        Args:
+            languages: OCR languages (default from config)
+            cpu_threads: Paddle inference threads on CPU. Keep at cpu_count // ml_workers
+                         so OCR does not oversubscribe cores shared with face matching.
+        """
         if languages is None:
             config_langs = config.get("models", "ocr", "languages", default=["en"])
             lang_map = {"en": "en", "es": "es", "de": "german", "pt": "portuguese", "fr": "french"}
@@ -431,6 +452,8 @@ class PaddleOCRExtractor:
         
         logger.info(f"Initializing PaddleOCR with language: {primary_lang}")
         
+        thread_kwargs = {"cpu_threads": cpu_threads} if cpu_threads else {}
+        
         try:
             use_gpu = config.get("models", "ocr", "gpu", default=False)
             self.ocr = PaddleOCR(
@@ -440,6 +463,7 @@ class PaddleOCRExtractor:
                 det_db_thresh=0.2,
                 det_db_box_thresh=0.4,
                 rec_batch_num=6,
+                **thread_kwargs,
                 # show_log=False
             )
             logger.info(f"✅ PaddleOCR initialized (device={'gpu' if use_gpu else 'cpu'})")
@@ -451,7 +475,8 @@ class PaddleOCRExtractor:
                 # show_log=False,
                 det_db_thresh=0.2,
                 det_db_box_thresh=0.4,
-                rec_batch_num=6
+                rec_batch_num=6,
+                **thread_kwargs
             )
             logger.info("✅ PaddleOCR initialized (legacy mode)")
         
@@ -986,8 +1011,10 @@ def get_ocr_extractor() -> PaddleOCRExtractor:
     if _ocr_instance is None:
         with _ocr_lock:
             if _ocr_instance is None:
+                ml_workers = config.get("processing", "ml_workers", default=2)
                 _ocr_instance = PaddleOCRExtractor(
                     languages=config.get("models", "ocr", "languages", default=["en"]),
+                    cpu_threads=max(1, (os.cpu_count() or 1) // ml_workers),
                 )
                 logger.info("✓ OCR extractor singleton created")
     return _ocr_instance
@@ -164,7 +164,7 @@ class ProfileDetector:
         if len(image.shape) == 3:
             gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         else:
-            gray = image.copy()
+            gray = image  # Read-only below (the flip makes its own array)
         
         # Detect left profile (direct detection)
         box_left, confidence_left = self._detect_with_cascade(gray, self.profile_cascade)
@@ -249,12 +249,14 @@ class ProfileDetector:
         Returns:
             Dictionary with:
             - orientations: List of detected orientations per frame
+            - boxes: List of orientation boxes per frame (None where nothing was detected)
             - orientation_frames: Frame indices where orientations were detected
             - left_frames: Frame indices where left was detected
             - right_frames: Frame indices where right was detected
             - face_detection_ratio: Ratio of frames with any orientation detected
         """
         orientations_list = []
+        boxes_list = []
         left_frames = []
         right_frames = []
         
@@ -262,6 +264,7 @@ class ProfileDetector:
             result = self.detect_orientation_frame(frame)
             orientation = result["orientation"]
             orientations_list.append(orientation)
+            boxes_list.append(result["box"])
             
             if orientation == "left":
                 left_frames.append(i)
@@ -273,6 +276,7 @@ class ProfileDetector:
         
         return {
             "orientations": orientations_list,
+            "boxes": boxes_list,
             "orientation_frames": left_frames + right_frames,
             "left_frames": left_frames,
             "right_frames": right_frames,
@@ -0,0 +1,75 @@
+# tests/test_admission.py
+
+"""
+Regression tests for utils.admission.AdmissionController slot accounting under cancellation.
+"""
+
+import asyncio
+
+import pytest
+
+from utils.admission import AdmissionController
+
+
+def test_cancel_then_release_raises_cancelled():
+    """A waiter cancelled before a release() that skips its future must raise CancelledError."""
+    async def scenario():
+        ac = AdmissionController(1)
+        await ac.acquire()
+        waiter = asyncio.create_task(ac.acquire())
+        await asyncio.sleep(0)  # Queue the waiter
+        
+        waiter.cancel()
+        ac.release()  # Pops and skips the cancelled future before the waiter resumes
+        
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert ac.active == 0
+        
+        # The slot is still usable
+        await asyncio.wait_for(ac.acquire(), timeout=1)
+        assert ac.active == 1
+    
+    asyncio.run(scenario())
+
+
+def test_cancel_after_wakeup_passes_slot_on():
+    """A waiter woken and then cancelled hands its slot to the next waiter."""
+    async def scenario():
+        ac = AdmissionController(1)
+        await ac.acquire()
+        first = asyncio.create_task(ac.acquire())
+        second = asyncio.create_task(ac.acquire())
+        await asyncio.sleep(0)
+        
+        ac.release()  # Slot handed to first
+        first.cancel()
+        
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        await asyncio.wait_for(second, timeout=1)
+        assert ac.active == 1
+        
+        ac.release()
+        assert ac.active == 0
+    
+    asyncio.run(scenario())
+
+
+def test_cancel_while_queued_leaves_no_waiter():
+    """Cancelling a queued waiter removes it without touching the active count."""
+    async def scenario():
+        ac = AdmissionController(1)
+        await ac.acquire()
+        waiter = asyncio.create_task(ac.acquire())
+        await asyncio.sleep(0)
+        
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert ac.active == 1
+        
+        ac.release()
+        assert ac.active == 0
+    
+    asyncio.run(scenario())
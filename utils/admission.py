@@ -0,0 +1,95 @@
+# utils/admission.py
+
+"""
+Request admission control for CPU/memory-heavy endpoints.
+Replaces a fixed asyncio.Semaphore so the concurrency cap can be
+changed at runtime (e.g. on config reload or under memory pressure).
+"""
+
+import asyncio
+from collections import deque
+
+
+class AdmissionController:
+    """
+    Counter with a FIFO queue of waiter futures (same scheme as asyncio.Semaphore).
+    Slots are handed directly to woken waiters, and release never awaits, so a
+    cancelled request can neither leak its slot nor swallow another's wakeup.
+    
+    Usage:
+        admission = AdmissionController(10)
+        async with admission:
+            ...
+    """
+    
+    def __init__(self, cap: int):
+        if cap < 1:
+            raise ValueError(f"Admission cap must be >= 1, got {cap}")
+        self._cap = cap
+        self._active = 0
+        self._waiters: deque = deque()
+    
+    @property
+    def cap(self) -> int:
+        """Current maximum number of concurrent holders."""
+        return self._cap
+    
+    @property
+    def active(self) -> int:
+        """Number of currently admitted holders."""
+        return self._active
+    
+    async def acquire(self) -> None:
+        """Wait until a slot is free, then take it."""
+        # Fast path only when nobody is queued, so waiters keep FIFO order
+        if not self._waiters and self._active < self._cap:
+            self._active += 1
+            return
+        
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Woken (slot already handed to us) then cancelled: pass the slot on
+                self.release()
+            else:
+                # A release() between the cancel and this resume may already have
+                # popped (and skipped) the cancelled future
+                try:
+                    self._waiters.remove(fut)
+                except ValueError:
+                    pass
+            raise
+    
+    def release(self) -> None:
+        """Free a slot and hand it to the next waiter, if any."""
+        self._active -= 1
+        self._wake_waiters()
+    
+    def _wake_waiters(self) -> None:
+        """Hand free slots to queued waiters in FIFO order."""
+        while self._waiters and self._active < self._cap:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self._active += 1
+                fut.set_result(None)
+    
+    async def set_cap(self, cap: int) -> None:
+        """
+        Change the concurrency cap.
+        Lowering it lets in-flight holders finish; new holders wait until
+        the active count drops below the new cap.
+        """
+        if cap < 1:
+            raise ValueError(f"Admission cap must be >= 1, got {cap}")
+        self._cap = cap
+        self._wake_waiters()
+    
+    async def __aenter__(self) -> "AdmissionController":
+        await self.acquire()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.release()